@@ -0,0 +1,62 @@
+"""Measure the per-image encode cost and the output size of every output format.
+
+Usage:
+    python benchmarks/bench_formats.py [-images 200]
+"""
+import argparse
+import io
+import os
+import sys
+import time
+
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, os.path.join(ROOT_DIR, "src"))
+
+from canvas import CanvasRenderer  # noqa: E402
+from encoders import Encoding, save_image  # noqa: E402
+
+ENCODINGS = [
+    Encoding("png"),
+    Encoding("png", 0),
+    Encoding("png", 1),
+    Encoding("png", 9),
+    Encoding("png", palette=True),
+    Encoding("png", 1, palette=True),
+    Encoding("bmp"),
+    Encoding("bmp", palette=True),
+    Encoding("ppm"),
+    Encoding("npy"),
+]
+
+
+def label(encoding):
+    level = "" if encoding.compress_level is None else f" level {encoding.compress_level}"
+    palette = " palette" if encoding.palette else ""
+    return f"{encoding.format}{level}{palette}"
+
+
+def bench(encoding, images):
+    renderer = CanvasRenderer(palette=encoding.palette)
+    total_bytes = 0
+    start = time.perf_counter()
+    for i in range(images):
+        output = io.BytesIO()
+        save_image(renderer.render((i * 7) % 400, (i * 13) % 361, (i * 31) % 361), output, encoding)
+        total_bytes += output.tell()
+    elapsed = time.perf_counter() - start
+    return elapsed / images, total_bytes / images
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the output formats on the 400x400 canvas")
+    parser.add_argument("-images", type=int, default=200, help="number of images per format")
+    args = parser.parse_args()
+
+    print(f"{'format':<22} {'ms/image':>9} {'images/sec':>11} {'KB/image':>9}")
+    for encoding in ENCODINGS:
+        seconds, size = bench(encoding, args.images)
+        print(f"{label(encoding):<22} {seconds * 1000:>9.3f} {1 / seconds:>11.1f} {size / 1024:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
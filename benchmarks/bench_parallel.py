@@ -0,0 +1,53 @@
+"""Measure the batch renderer throughput (images/sec) from 1 worker up to every core.
+
+Usage:
+    python benchmarks/bench_parallel.py [-jobs 2000] [-max-workers N] [-chunksize 16]
+"""
+import argparse
+import io
+import os
+import sys
+import tempfile
+import time
+
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, os.path.join(ROOT_DIR, "src"))
+
+from batch import run_batch  # noqa: E402
+
+
+def worker_counts(max_workers):
+    counts, n = [], 1
+    while n < max_workers:
+        counts.append(n)
+        n *= 2
+    return counts + [max_workers]
+
+
+def bench(jobs, workers, chunksize, out_dir):
+    entries = [(i, {"d": (i * 7) % 400, "hue": (i * 13) % 361, "path": os.path.join(out_dir, f"{i}.png")}) for i in range(jobs)]
+    start = time.perf_counter()
+    rendered, failed = run_batch(entries, out=io.StringIO(), workers=workers, chunksize=chunksize)
+    elapsed = time.perf_counter() - start
+    assert failed == 0, f"{failed} jobs failed"
+    return rendered / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the parallel batch renderer on the 400x400 canvas")
+    parser.add_argument("-jobs", type=int, default=2000, help="number of images per run")
+    parser.add_argument("-max-workers", type=int, default=os.cpu_count(), help="largest worker count to measure")
+    parser.add_argument("-chunksize", type=int, default=16, help="jobs dispatched to a worker at once")
+    args = parser.parse_args()
+
+    print(f"{'workers':>8} {'images/sec':>12} {'speedup':>8}")
+    baseline = None
+    with tempfile.TemporaryDirectory() as out_dir:
+        for workers in worker_counts(args.max_workers):
+            rate = bench(args.jobs, workers, args.chunksize, out_dir)
+            baseline = baseline or rate
+            print(f"{workers:>8} {rate:>12.1f} {rate / baseline:>7.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,184 @@
+"""Sweep the diameter range and a set of hues, timing every stage of rendering and detecting a circle.
+
+Every case goes through the shipped entry points with the ``instrument``
+stage timers on, so the benchmark measures the code that runs in production:
+
+* ``-entry draw`` renders with ``circlemaker.draw_image``, ``-entry batch``
+  with ``batch.render_job`` and its reused ``CanvasRenderer``. Both record the
+  ``render``, ``render.allocate`` (a new canvas, or clearing the reused one),
+  ``encode`` and ``write`` stages. Canvases of ``-size`` 1024 and more go
+  through ``streampng`` and only record ``render``,
+* the ``CircleDetector`` of ``-method`` records ``detect.hsv``,
+  ``detect.mask`` and ``detect.<method>``, split into ``detect.find_contours``
+  and ``detect.enclose`` for ``contour``. The benchmark adds ``detect.load``.
+
+The cases are timed apart from a ``CIRCLEMAKER_PROFILE`` session, which is
+left as it was.
+
+The results are written as JSON so that two commits can be compared: with
+``-baseline`` every stage whose median got slower than the threshold is
+reported and the script exits with status 1.
+
+Usage:
+    python benchmarks/bench_sweep.py [-step 1] [-hues 0,45,...,360] [-repeat 1] [-entry draw] [-size 400]
+                                     [-method contour] [-output results.json] [-baseline baseline.json]
+                                     [-threshold 0.15] [-min-ms 0.01]
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, os.path.join(ROOT_DIR, "src"))
+sys.path.insert(0, os.path.join(ROOT_DIR, "tests"))
+
+import cv2 as cv  # noqa: E402
+import numpy as np  # noqa: E402
+import PIL  # noqa: E402
+
+import instrument  # noqa: E402
+from batch import render_job  # noqa: E402
+from circlemaker import CANVAS_SIZE, d_range, draw_image  # noqa: E402
+from utils.circledetector import METHODS, CircleDetector  # noqa: E402
+
+ENTRIES = ("draw", "batch")
+DEFAULT_HUES = "0,45,90,135,180,225,270,315,360"
+BUCKET_SIZE = 100
+
+
+def summarize(samples):
+    return {
+        "count": len(samples),
+        "mean_ms": sum(samples) / len(samples),
+        "p50_ms": instrument.percentile(samples, 50),
+        "p95_ms": instrument.percentile(samples, 95),
+    }
+
+
+def run_case(d, hue, path, entry="draw", size=CANVAS_SIZE, method="contour"):
+    """Render and detect one circle, return the milliseconds of every stage recorded by the instrument timers."""
+    with instrument.isolated():
+        start = time.perf_counter()
+        if entry == "draw":
+            draw_image(d, hue, path, canvas_size=size)
+        else:
+            result = render_job(1, {"d": d, "hue": hue, "path": path}, size=size)
+            if result.error is not None:
+                raise result.error
+        render_total = time.perf_counter() - start
+
+        start = time.perf_counter()
+        with instrument.timer("detect.load"):
+            img = cv.imread(path)
+        CircleDetector(img, hue, method=method).get_circle_radius()
+        detect_total = time.perf_counter() - start
+
+        summary, _ = instrument.stats()
+
+    times = {stage: s["total"] * 1000 for stage, s in summary.items()}
+    times["render.total"] = render_total * 1000
+    times["detect.total"] = detect_total * 1000
+    return times
+
+
+def sweep(ds, hues, repeat, entry="draw", size=CANVAS_SIZE, method="contour"):
+    times = {}
+    buckets = {}
+    with tempfile.TemporaryDirectory() as out_dir:
+        path = os.path.join(out_dir, "test.png")
+        for d in ds:
+            low = d // BUCKET_SIZE * BUCKET_SIZE
+            bucket_times = buckets.setdefault(f"{low}-{min(low + BUCKET_SIZE - 1, d_range(size)[1])}", {})
+            for hue in hues:
+                for _ in range(repeat):
+                    for stage, ms in run_case(d, hue, path, entry, size, method).items():
+                        times.setdefault(stage, []).append(ms)
+                        bucket_times.setdefault(stage, []).append(ms)
+
+    return {
+        "stages": {stage: summarize(samples) for stage, samples in sorted(times.items())},
+        "by_diameter": {
+            bucket: {stage: instrument.percentile(samples, 50) for stage, samples in sorted(bucket_times.items())}
+            for bucket, bucket_times in buckets.items()
+        },
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], cwd=ROOT_DIR, capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline, threshold, min_ms):
+    """Return the regression messages of the stages whose median got slower than the threshold."""
+    regressions = []
+    for stage, current in results["stages"].items():
+        previous = baseline["stages"].get(stage)
+        if previous is None:
+            continue
+        slower = current["p50_ms"] - previous["p50_ms"]
+        if slower > min_ms and current["p50_ms"] > previous["p50_ms"] * (1 + threshold):
+            regressions.append(f"{stage}: p50 {previous['p50_ms']:.3f} ms -> {current['p50_ms']:.3f} ms (+{slower / previous['p50_ms']:.0%})")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark every render and detect stage across the diameter range")
+    parser.add_argument("-step", type=int, default=1, help="diameter step of the sweep over [0 size - 1]")
+    parser.add_argument("-hues", type=str, default=DEFAULT_HUES, help="comma separated hues of every diameter")
+    parser.add_argument("-repeat", type=int, default=1, help="number of runs of every (d, hue) case")
+    parser.add_argument("-entry", choices=ENTRIES, default="draw", help="render with draw_image or the batch render_job")
+    parser.add_argument("-size", type=int, default=CANVAS_SIZE, help="canvas size, 1024 and more stream the PNG")
+    parser.add_argument("-method", choices=METHODS, default="contour", help="radius detection method of the CircleDetector")
+    parser.add_argument("-output", type=str, default=None, help="write the JSON results to this path")
+    parser.add_argument("-baseline", type=str, default=None, help="JSON results of a previous run to compare with")
+    parser.add_argument("-threshold", type=float, default=0.15, help="relative p50 slowdown reported as a regression")
+    parser.add_argument("-min-ms", type=float, default=0.01, help="absolute p50 slowdown below which a stage never regresses")
+    args = parser.parse_args()
+
+    ds = list(range(d_range(args.size)[0], d_range(args.size)[1] + 1, args.step))
+    hues = [float(hue) for hue in args.hues.split(",")]
+    results = {
+        "meta": {
+            "commit": git_commit(),
+            "python": platform.python_version(),
+            "pillow": PIL.__version__,
+            "opencv": cv.__version__,
+            "numpy": np.__version__,
+            "machine": platform.machine(),
+            "cases": len(ds) * len(hues) * args.repeat,
+            "entry": args.entry,
+            "size": args.size,
+            "method": args.method,
+        },
+        **sweep(ds, hues, args.repeat, args.entry, args.size, args.method),
+    }
+
+    print(f"{'stage':<20} {'mean ms':>9} {'p50 ms':>9} {'p95 ms':>9}")
+    for stage, summary in results["stages"].items():
+        print(f"{stage:<20} {summary['mean_ms']:>9.3f} {summary['p50_ms']:>9.3f} {summary['p95_ms']:>9.3f}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.threshold, args.min_ms)
+        for regression in regressions:
+            print(f"REGRESSION {regression}", file=sys.stderr)
+        if regressions:
+            return 1
+        print(f"no stage slower than the baseline by more than {args.threshold:.0%}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -23,6 +23,11 @@ PKG_REQUIREMENTS = [
     "Pillow == 10.2.0",
 ]
 
+# npy outputs and archives, render_array, the rasterizer and the streamed png of big canvases
+NUMPY_REQUIREMENTS = [
+    "numpy >= 1.21",
+]
+
 DEV_REQUIREMENTS = [
     "opencv-python==4.6.0.66",
     "pytest==7.1.2",
@@ -59,7 +64,7 @@ setup(
     ),
     package_dir={"": "src"},
     install_requires=PKG_REQUIREMENTS,
-    extras_require={"dev": DEV_REQUIREMENTS},
+    extras_require={"numpy": NUMPY_REQUIREMENTS, "dev": NUMPY_REQUIREMENTS + DEV_REQUIREMENTS},
     include_package_data=True,
     classifiers=[
         # Complete classifier list: http://pypi.python.org/pypi?%3Aaction=list_classifiers
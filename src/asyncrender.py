@@ -0,0 +1,114 @@
+"""An asyncio rendering API, for serving circles from an event loop.
+
+``draw_image`` blocks its caller for the whole rasterization, encode and file
+write. ``AsyncRenderer`` runs the rendering in a bounded executor and the file
+writes in a separate pool of I/O threads, so the event loop only awaits:
+
+    async with AsyncRenderer() as renderer:
+        data = await renderer.render_bytes(89, 89, seed=7)
+        await renderer.draw_image(89, 89, '/srv/circles/89.png', seed=7)
+
+Identical requests in flight at the same time, same ``(d, hue, seed)``,
+encoding and canvas size, are coalesced into a single render whose result they all share.
+Requests without a seed are coalesced too: they get the same random border.
+At most ``max_pending`` renders are handed to the executor at once, the
+others wait on the event loop, so a burst of requests never piles up in the
+executor's queue. Requests are validated before they are queued, an invalid
+one raises ValueError right away.
+"""
+import argparse
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from circlemaker import (CANVAS_SIZE, D_RANGE, HUE_RANGE, SIZE_RANGE, d_range, float_in_range, int_at_least,
+                         int_in_range, render_bytes)
+from encoders import PNG, check_encoding, open_output
+
+_check_d = float_in_range(*D_RANGE)
+_check_hue = float_in_range(*HUE_RANGE)
+_check_seed = int_at_least(0)
+_check_size = int_in_range(*SIZE_RANGE)
+
+
+def _request_key(d, hue, seed, encoding, canvas_size):
+    """Validate a render request and return its coalescing key, raising ValueError."""
+    try:
+        size = _check_size(canvas_size)
+        d = (_check_d if size == CANVAS_SIZE else float_in_range(*d_range(size)))(d)
+        hue = _check_hue(hue)
+        seed = None if seed is None else _check_seed(seed)
+    except argparse.ArgumentTypeError as e:
+        raise ValueError(str(e))
+    check_encoding(encoding)
+    return d, hue, seed, encoding, size
+
+
+def _write_file(path, data):
+    with open_output(path) as f:
+        f.write(data)
+
+
+class AsyncRenderer:
+    """Render circles without blocking the event loop.
+
+    Args:
+        max_workers (int, optional): the rendering threads. Defaults to the number of cores.
+        max_pending (int, optional): the renders submitted to the executor at once. Defaults to twice the workers.
+        io_workers (int, optional): the file writing threads. Defaults to 4.
+        executor (concurrent.futures.Executor, optional): render in this executor (e.g. a process pool) instead of
+            a thread pool of ``max_workers``, it is not shut down by ``close``. Defaults to None.
+    """
+
+    def __init__(self, max_workers=None, max_pending=None, io_workers=4, executor=None):
+        max_workers = max_workers or os.cpu_count()
+        self._own_executor = executor is None
+        self._executor = executor or ThreadPoolExecutor(max_workers, thread_name_prefix='circlemaker-render')
+        self._io_executor = ThreadPoolExecutor(io_workers, thread_name_prefix='circlemaker-io')
+        self._max_pending = max_pending or 2 * max_workers
+        self._slots = None  # created in the running loop
+        self._in_flight = {}
+
+        self.renders = 0
+        self.coalesced = 0
+
+    async def render_bytes(self, d, hue, seed=None, encoding=PNG, canvas_size=CANVAS_SIZE):
+        """Return the encoded image of a circle, see ``circlemaker.render_bytes``.
+
+        Raises:
+            ValueError: if d, hue, seed, encoding or canvas_size is invalid or out of range.
+        """
+        key = _request_key(d, hue, seed, encoding, canvas_size)
+        task = self._in_flight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._render(key))
+            self._in_flight[key] = task
+            task.add_done_callback(lambda _: self._in_flight.pop(key, None))
+        else:
+            self.coalesced += 1
+        # a cancelled caller must not cancel the render the other callers wait for
+        return await asyncio.shield(task)
+
+    async def draw_image(self, d, hue, output_path, seed=None, encoding=PNG, canvas_size=CANVAS_SIZE):
+        """Render a circle and write it to ``output_path``, see ``circlemaker.draw_image``."""
+        data = await self.render_bytes(d, hue, seed, encoding, canvas_size)
+        await asyncio.get_running_loop().run_in_executor(self._io_executor, _write_file, output_path, data)
+
+    async def _render(self, key):
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self._max_pending)
+        async with self._slots:
+            self.renders += 1
+            return await asyncio.get_running_loop().run_in_executor(self._executor, render_bytes, *key)
+
+    def close(self):
+        """Wait for the submitted work and stop the threads."""
+        if self._own_executor:
+            self._executor.shutdown(wait=True)
+        self._io_executor.shutdown(wait=True)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await asyncio.get_running_loop().run_in_executor(None, self.close)
@@ -0,0 +1,305 @@
+"""Render many circles from a job manifest in a single long-lived process,
+or spread them over a pool of worker processes.
+
+A manifest is either a CSV file with a ``d,hue,path`` header or a JSON Lines
+file with one ``{"d": ..., "hue": ..., "path": ...}`` object per line. An
+optional ``seed`` column/key makes the random border hue of that job
+reproducible, and an optional ``size`` column/key sets its canvas size.
+"""
+import argparse
+import csv
+import functools
+import io
+import itertools
+import json
+import multiprocessing
+import signal
+import sys
+from collections import namedtuple
+
+import instrument
+from cache import RenderCache
+from canvas import CanvasRenderer
+from circlemaker import (CANVAS_SIZE, D_RANGE, HUE_RANGE, SIZE_RANGE, d_range, float_in_range, int_at_least,
+                         int_in_range, pick_border_hue, streams)
+from encoders import PNG, open_output, save_image
+
+Job = namedtuple('Job', ['d', 'hue', 'path', 'seed', 'size'], defaults=[None, CANVAS_SIZE])
+
+REQUIRED_FIELDS = ('d', 'hue', 'path')
+
+JobResult = namedtuple('JobResult', ['line', 'job', 'error', 'cached', 'border_hue', 'data'], defaults=[False, None, None])
+
+DEFAULT_CHUNKSIZE = 16
+
+_renderers = {}  # one reused canvas per process, canvas mode and size, created on the first job
+_worker_cache = None  # the render cache of a worker process
+
+_check_d = float_in_range(*D_RANGE)
+_check_hue = float_in_range(*HUE_RANGE)
+_check_seed = int_at_least(0)
+_check_size = int_in_range(*SIZE_RANGE)
+
+
+def read_manifest(stream):
+    """Yield ``(line, fields)`` pairs from a CSV or JSON Lines manifest."""
+    lines = iter(stream)
+    for line_no, first in enumerate(lines, 1):
+        if first.strip():
+            break
+    else:
+        return
+
+    if first.lstrip().startswith('{'):
+        yield line_no, _parse_json(first)
+        for line_no, line in enumerate(lines, line_no + 1):
+            if line.strip():
+                yield line_no, _parse_json(line)
+    else:
+        offset = line_no - 1
+        reader = csv.DictReader(itertools.chain([first], lines), skipinitialspace=True)
+        for fields in reader:
+            if any(fields.values()):
+                yield offset + reader.line_num, fields
+
+
+def _parse_json(line):
+    try:
+        fields = json.loads(line)
+    except ValueError as e:
+        return ValueError(f'invalid JSON: {e}')
+    if not isinstance(fields, dict):
+        return ValueError('a JSON job must be an object')
+    return fields
+
+
+def parse_job(fields, seed=None, size=CANVAS_SIZE):
+    """Validate a manifest entry and turn it into a ``Job``.
+
+    Args:
+        fields (dict): the manifest entry.
+        seed (int, optional): the seed of jobs without their own ``seed`` field. Defaults to None.
+        size (int, optional): the canvas size of jobs without their own ``size`` field. Defaults to CANVAS_SIZE.
+
+    Raises:
+        ValueError: if a field is missing, malformed or out of range.
+    """
+    if isinstance(fields, Exception):
+        raise fields
+
+    for name in REQUIRED_FIELDS:
+        if fields.get(name) in (None, ''):
+            raise ValueError(f'missing field \'{name}\'')
+
+    if fields.get('size') not in (None, ''):
+        try:
+            size = _check_size(fields['size'])
+        except argparse.ArgumentTypeError as e:
+            raise ValueError(f'field size: {e}')
+
+    try:
+        d = (_check_d if size == CANVAS_SIZE else float_in_range(*d_range(size)))(fields['d'])
+    except argparse.ArgumentTypeError as e:
+        raise ValueError(f'field d: {e}')
+    try:
+        hue = _check_hue(fields['hue'])
+    except argparse.ArgumentTypeError as e:
+        raise ValueError(f'field hue: {e}')
+    if fields.get('seed') not in (None, ''):
+        try:
+            seed = _check_seed(fields['seed'])
+        except argparse.ArgumentTypeError as e:
+            raise ValueError(f'field seed: {e}')
+
+    return Job(d, hue, str(fields['path']), seed, size)
+
+
+def render_job(line, fields, seed=None, cache=None, encoding=PNG, capture=False, size=CANVAS_SIZE):
+    """Render one manifest entry into a ``JobResult``.
+
+    With ``capture`` the encoded image is returned in the result's ``data``
+    instead of being written to the job's path.
+    """
+    try:
+        job = parse_job(fields, seed, size)
+    except ValueError as e:
+        return JobResult(line, None, e)
+
+    try:
+        border_hue = pick_border_hue(job.seed)
+        if capture:
+            return JobResult(line, job, None, False, border_hue, _encode(job, border_hue, encoding))
+        cached = _render(job, border_hue, cache, encoding)
+    except Exception as e:  # Pillow and OS errors only fail this job
+        return JobResult(line, job, e)
+
+    return JobResult(line, job, None, cached, border_hue)
+
+
+def _renderer(palette, size=CANVAS_SIZE):
+    renderer = _renderers.get((palette, size))
+    if renderer is None:
+        renderer = _renderers[palette, size] = CanvasRenderer(size, palette)
+    return renderer
+
+
+def _save(job, border_hue, encoding, output):
+    if streams(encoding, job.size):
+        from streampng import write_png
+
+        write_png(output, job.d, job.hue, border_hue, job.size, encoding)
+    else:
+        save_image(_renderer(encoding.palette, job.size).render(job.d, job.hue, border_hue), output, encoding)
+
+
+def _encode(job, border_hue, encoding):
+    buffer = io.BytesIO()
+    _save(job, border_hue, encoding, buffer)
+    return buffer.getvalue()
+
+
+def _render(job, border_hue, cache, encoding):
+    if cache is None:
+        if streams(encoding, job.size):
+            with open_output(job.path) as f:
+                _save(job, border_hue, encoding, f)
+        else:
+            _save(job, border_hue, encoding, job.path)
+        return False
+
+    key = RenderCache.key(d=job.d, hue=job.hue, border_hue=border_hue, size=job.size, **encoding._asdict())
+    if cache.restore(key, job.path):
+        return True
+
+    data = _encode(job, border_hue, encoding)
+    with open_output(job.path) as f:
+        f.write(data)
+    cache.store(key, data)
+    return False
+
+
+def _render_entry(entry, seed=None, encoding=PNG, capture=False, size=CANVAS_SIZE):
+    return render_job(*entry, seed=seed, cache=_worker_cache, encoding=encoding, capture=capture, size=size)
+
+
+def _init_worker(cache_config):
+    global _worker_cache
+
+    # Only the parent reacts to Ctrl-C, it then terminates the whole pool
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    if cache_config is not None:
+        _worker_cache = RenderCache(*cache_config)
+
+
+def iter_results(entries, workers=1, chunksize=DEFAULT_CHUNKSIZE, seed=None, cache=None, encoding=PNG, capture=False,
+                 size=CANVAS_SIZE):
+    """Render ``(line, fields)`` entries and yield their ``JobResult`` in manifest order.
+
+    Args:
+        entries (iterable): the manifest entries as yielded by ``read_manifest``.
+        workers (int, optional): number of worker processes, 1 renders in-process. Defaults to 1.
+        chunksize (int, optional): number of jobs handed to a worker at once. Defaults to 16.
+        seed (int, optional): the seed of jobs without their own ``seed`` field. Defaults to None.
+        cache (RenderCache, optional): the render cache, each worker opens its own on the same directory and they
+            share its size cap. Defaults to None.
+        encoding (Encoding, optional): the output format of every job. Defaults to PNG.
+        capture (bool, optional): return the encoded images instead of writing them, see ``render_job``. Defaults to False.
+        size (int, optional): the canvas size of jobs without their own ``size`` field. Defaults to CANVAS_SIZE.
+    """
+    if workers <= 1:
+        for entry in entries:
+            yield render_job(*entry, seed=seed, cache=cache, encoding=encoding, capture=capture, size=size)
+        return
+
+    cache_config = None if cache is None else (cache.directory, cache.max_bytes, cache.link, workers)
+    pool = multiprocessing.Pool(workers, initializer=_init_worker, initargs=(cache_config,))
+    try:
+        yield from pool.imap(functools.partial(_render_entry, seed=seed, encoding=encoding, capture=capture, size=size), entries, chunksize)
+    except BaseException:
+        pool.terminate()
+        raise
+    else:
+        pool.close()
+    finally:
+        pool.join()
+
+
+def _changed_entries(entries, index, seed, encoding, size):
+    for line, fields in entries:
+        try:
+            job = parse_job(fields, seed, size)
+        except ValueError:
+            pass  # reported by the renderer
+        else:
+            if index.is_current(job, encoding):
+                continue
+        yield line, fields
+
+
+def run_batch(entries, out=None, err=None, workers=1, chunksize=DEFAULT_CHUNKSIZE, seed=None, cache=None, encoding=PNG,
+              pipeline=False, sink=None, index=None, force=False, size=CANVAS_SIZE):
+    """Render every ``(line, fields)`` entry, reporting failures per job.
+
+    Results are reported in manifest order, whatever the number of workers.
+    With ``pipeline`` the jobs go through ``pipeline.stream_results`` and
+    ``workers`` is its number of encoding threads. With a ``sink`` (see
+    ``sinks.open_sink``) the images are written into a single archive, in the
+    sink's encoding. Neither supports a cache.
+
+    With an ``index`` (see ``incremental.BuildIndex``) the jobs whose output is
+    up to date are skipped, unless ``force``, and the index is updated with
+    the outputs written. Saving it is left to the caller.
+
+    ``size`` is the canvas size of the jobs without their own ``size`` field.
+
+    Returns:
+        tuple: the number of rendered and failed jobs.
+    """
+    out = out or sys.stdout
+    err = err or sys.stderr
+
+    if cache is not None and (pipeline or sink is not None):
+        raise ValueError('a render cache can only be used when writing separate files without the pipeline')
+    if index is not None and sink is not None:
+        raise ValueError('an incremental index can only be used when writing separate files')
+    if sink is not None:
+        encoding = sink.encoding
+    if index is not None and not force:
+        entries = _changed_entries(entries, index, seed, encoding, size)
+
+    if pipeline:
+        from pipeline import stream_results
+
+        results = stream_results(entries, workers, seed=seed, encoding=encoding, sink=sink, size=size)
+    else:
+        results = iter_results(entries, workers, chunksize, seed, cache, encoding, capture=sink is not None, size=size)
+
+    rendered = failed = hits = 0
+    for result in results:
+        if result.error is None and result.data is not None:
+            try:
+                sink.write(result.job, result.border_hue, result.data)
+            except Exception as e:
+                result = result._replace(error=e)
+        if result.error is None:
+            rendered += 1
+            hits += result.cached
+            if index is not None:
+                index.update(result.job, encoding)
+            print(f'ok {result.job.path}', file=out)
+        else:
+            failed += 1
+            if index is not None and result.job is not None:
+                index.forget(result.job.path)
+            print(f'error: line {result.line}: {result.error}', file=err)
+
+    instrument.count('batch.rendered', rendered)
+    instrument.count('batch.failed', failed)
+    instrument.count('batch.cache_hits', hits)
+    print(f'{rendered} rendered, {failed} failed', file=out)
+    if cache is not None:
+        print(f'cache: {hits} hits, {rendered - hits} misses', file=out)
+    if index is not None:
+        instrument.count('batch.unchanged', index.unchanged)
+        print(f'incremental: {index.unchanged} unchanged', file=out)
+    return rendered, failed
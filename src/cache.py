@@ -0,0 +1,184 @@
+"""An on-disk, content-addressed cache of rendered images.
+
+Entries are keyed by a hash of the render parameters, so a repeated
+``(d, hue, border hue)`` turns into a file copy (or a hard link) instead of a
+rasterization and a PNG encode. The cache directory is capped in size and the
+least recently used entries are evicted first; the recency survives between
+runs through the entries' modification time.
+
+Several processes can share one cache directory: entries are written
+atomically, an entry stored by another process is found on disk and an entry
+evicted by another process is simply a miss. Each of ``processes`` sharing a
+directory rescans it after storing ``max_bytes / (RESCAN_SHARE * processes)``
+bytes and evicts over the entries of every process, so together they exceed
+the size cap by at most ``1 / RESCAN_SHARE``.
+"""
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+from collections import OrderedDict
+
+from encoders import detach_output
+
+CACHE_VERSION = 1  # bump whenever the rendered output of the same parameters changes
+DEFAULT_MAX_BYTES = 1024 * 1024 * 1024
+RESCAN_SHARE = 8
+
+_SUFFIX = '.img'
+
+
+class RenderCache:
+    """LRU cache of encoded images in a directory.
+
+    Args:
+        directory (string): the cache directory, created if missing.
+        max_bytes (int, optional): the size cap of the cached entries. Defaults to 1 GiB.
+        link (bool, optional): hard-link hits to the output path instead of copying them. Defaults to False.
+        processes (int, optional): the processes sharing the directory at the same time, e.g. the batch workers.
+            Defaults to 1.
+    """
+
+    def __init__(self, directory, max_bytes=DEFAULT_MAX_BYTES, link=False, processes=1):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.link = link
+        self.processes = processes
+        # a single process knows every entry, it never needs to rescan
+        self.__rescan_bytes = None if processes <= 1 else max(1, max_bytes // (RESCAN_SHARE * processes))
+        self.__stored = 0  # bytes stored since the last scan
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        os.makedirs(directory, exist_ok=True)
+        self.__entries = OrderedDict()  # key -> size, least recently used first
+        self.__size = 0
+        self.__load()
+
+    @staticmethod
+    def key(**params):
+        """Return the cache key of a set of render parameters."""
+        params = {name: float(value) if type(value) is int else value for name, value in params.items()}
+        blob = json.dumps([CACHE_VERSION, params], sort_keys=True).encode()
+        return hashlib.sha256(blob).hexdigest()
+
+    def restore(self, key, output_path):
+        """Write the cached entry of ``key`` to ``output_path``.
+
+        Returns:
+            bool: True on a hit, False if ``key`` is not cached.
+        """
+        entry = self.__path(key)
+        if key not in self.__entries:
+            self.__adopt(key)
+        if key in self.__entries:
+            try:
+                self.__copy(entry, output_path)
+                os.utime(entry)
+            except FileNotFoundError:  # evicted by another process
+                self.__forget(key)
+            else:
+                self.__entries.move_to_end(key)
+                self.hits += 1
+                return True
+
+        self.misses += 1
+        return False
+
+    def store(self, key, data):
+        """Cache the encoded image ``data`` under ``key`` and evict entries over the size cap."""
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, self.__path(key))
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+        self.__forget(key)
+        self.__entries[key] = len(data)
+        self.__size += len(data)
+        self.__stored += len(data)
+        if self.__rescan_bytes is not None and self.__stored >= self.__rescan_bytes:
+            self.__load()
+        else:
+            self.__evict()
+
+    def stats(self):
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'entries': len(self.__entries),
+            'bytes': self.__size,
+        }
+
+    def __len__(self):
+        return len(self.__entries)
+
+    def __contains__(self, key):
+        return key in self.__entries
+
+    def __path(self, key):
+        return os.path.join(self.directory, key + _SUFFIX)
+
+    def __copy(self, entry, output_path):
+        if self.link:
+            try:
+                if os.path.lexists(output_path):
+                    os.unlink(output_path)
+                os.link(entry, output_path)
+                return
+            except FileNotFoundError:
+                raise
+            except OSError:  # e.g. across file systems, fall back to a copy
+                pass
+        detach_output(output_path)
+        shutil.copyfile(entry, output_path)
+
+    def __adopt(self, key):
+        """Track the entry of ``key`` if another process stored it."""
+        try:
+            size = os.stat(self.__path(key)).st_size
+        except FileNotFoundError:
+            return
+        self.__entries[key] = size
+        self.__size += size
+
+    def __forget(self, key):
+        size = self.__entries.pop(key, None)
+        if size is not None:
+            self.__size -= size
+
+    def __evict(self):
+        while self.__size > self.max_bytes and self.__entries:
+            key, size = self.__entries.popitem(last=False)
+            self.__size -= size
+            self.evictions += 1
+            try:
+                os.unlink(self.__path(key))
+            except FileNotFoundError:
+                pass
+
+    def __load(self):
+        """(Re)build the entries from the directory, least recently modified first, and evict over the size cap."""
+        entries = []
+        with os.scandir(self.directory) as it:
+            for item in it:
+                if item.name.endswith(_SUFFIX) and item.is_file():
+                    try:
+                        stat = item.stat()
+                    except FileNotFoundError:  # evicted by another process
+                        continue
+                    entries.append((stat.st_mtime_ns, item.name[:-len(_SUFFIX)], stat.st_size))
+
+        self.__entries.clear()
+        self.__size = self.__stored = 0
+        for _, key, size in sorted(entries):
+            self.__entries[key] = size
+            self.__size += size
+        self.__evict()
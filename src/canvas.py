@@ -0,0 +1,77 @@
+"""A renderer that reuses one preallocated canvas between images.
+
+``draw_image`` allocates a white canvas and a new ``ImageDraw`` for every
+circle. When many circles are drawn in a row the background never changes, so
+``CanvasRenderer`` keeps a single canvas alive and only repaints the bounding
+box dirtied by the previous circle. The border is redrawn every time as its
+hue changes per image, which also overwrites any part of the circle that
+reached it, so the output is pixel-identical to ``draw_image``.
+"""
+import math
+
+from PIL import Image, ImageDraw
+
+import instrument
+from circlemaker import CANVAS_SIZE, palette_of, pick_border_hue
+from colors import WHITE, hue_rgb
+from encoders import PNG, save_image
+
+# palette indexes of a P-mode canvas
+_BACKGROUND, _CIRCLE, _BORDER = 0, 1, 2
+
+
+class CanvasRenderer:
+    """Draw circles on a reused canvas.
+
+    The image returned by ``render`` is the renderer's own canvas: it is only
+    valid until the next call, copy it if it must outlive that.
+
+    Args:
+        canvas_size (int, optional): the canvas width and height. Defaults to CANVAS_SIZE.
+        palette (bool, optional): draw on a P-mode canvas whose palette holds the three colors of the image,
+            like ``render_image(..., palette=True)``. Defaults to False.
+    """
+
+    def __init__(self, canvas_size=CANVAS_SIZE, palette=False):
+        self._size = canvas_size
+        self._palette = palette
+        if palette:
+            self._image = Image.new('P', (canvas_size, canvas_size), _BACKGROUND)
+        else:
+            self._image = Image.new('RGB', (canvas_size, canvas_size), 'white')
+        self._draw = ImageDraw.Draw(self._image)
+        self._dirty = None
+
+    @instrument.timed('render')
+    def render(self, d, hue, border_hue):
+        background, fill, outline = WHITE, hue_rgb(hue), hue_rgb(border_hue)
+        if self._palette:
+            self._image.putpalette(palette_of(hue, border_hue))
+            background, fill, outline = _BACKGROUND, _CIRCLE, _BORDER
+
+        if self._dirty is not None:
+            with instrument.timer('render.allocate'):  # the reused canvas is cleared instead of allocated
+                self._image.paste(background, self._dirty)
+
+        center = self._size / 2
+        box = (center - d / 2, center - d / 2, center + d / 2, center + d / 2)
+        self._draw.ellipse(box, fill=fill)
+        self._draw.rectangle(
+            (0, 0, self._size - 1, self._size - 1),
+            outline=outline
+        )
+        self._dirty = self._dirty_box(box)
+        return self._image
+
+    def draw_image(self, d, hue, output_path, seed=None, encoding=PNG):
+        save_image(self.render(d, hue, pick_border_hue(seed)), output_path, encoding)
+
+    def _dirty_box(self, box):
+        # one pixel of margin around the ellipse bounding box, clipped to the inside of the border
+        left = max(math.floor(box[0]) - 1, 1)
+        upper = max(math.floor(box[1]) - 1, 1)
+        right = min(math.ceil(box[2]) + 2, self._size - 1)
+        lower = min(math.ceil(box[3]) + 2, self._size - 1)
+        if left >= right or upper >= lower:
+            return None
+        return (left, upper, right, lower)
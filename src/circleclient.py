@@ -0,0 +1,92 @@
+"""A lightweight client of the ``renderd.py`` render server.
+
+It takes the same arguments as ``circlemaker.py`` and validates them with the
+same parser, but it doesn't import Pillow: the drawing is done by the warm
+server. When no server is listening it falls back to drawing in-process. The
+server only draws single images, so the batch, scene and profiling options
+are rejected.
+
+Usage:
+    python circleclient.py -d 89 -hue 89 -path test.png [-socket PATH]
+"""
+import json
+import os
+import socket
+import sys
+
+from circlemaker import build_parser, parse_args, peek_canvas_size
+from renderd import SOCKET_ENV, default_socket_path
+
+TIMEOUT_SECONDS = 30
+
+SERVER_OPTIONS_ERROR = 'the render server only draws single images, use circlemaker.py for {}'
+
+
+class ServerUnavailable(OSError):
+    """No render server accepts connections on the socket."""
+
+
+def request(socket_path, payload):
+    """Send one render request and return the server's error message, None on success.
+
+    Raises:
+        ServerUnavailable: if the server can't be reached.
+        OSError: if the request fails once the server accepted it, e.g. a timeout.
+    """
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+        client.settimeout(TIMEOUT_SECONDS)
+        try:
+            client.connect(socket_path)
+        except OSError as e:
+            raise ServerUnavailable(f'no render server on {socket_path}: {e}') from e
+        client.sendall(json.dumps(payload).encode() + b'\n')
+        with client.makefile('rb') as response:
+            line = response.readline()
+    if not line:
+        raise ConnectionError('the render server closed the connection')
+    return json.loads(line)['error']
+
+
+def main(argv=None):
+    parser = build_parser(peek_canvas_size(argv))
+    parser.add_argument(
+        '-socket', type=str, default=None,
+        help=f'socket path of the render server (default: ${SOCKET_ENV} or a per-user path in the temp directory)')
+    args = parse_args(argv, parser, profile=False)
+
+    unsupported = [option for option, value in (('-batch', args.batch), ('-scene', args.scene), ('-cache', args.cache),
+                                                ('-incremental', args.incremental), ('-profile', args.profile))
+                   if value is not None]
+    if unsupported:
+        parser.error(SERVER_OPTIONS_ERROR.format(', '.join(unsupported)))
+    if args.d is None or args.hue is None or args.path is None:
+        parser.error('the arguments -d, -hue and -path are required')
+
+    payload = {
+        'd': args.d,
+        'hue': args.hue,
+        'path': os.path.abspath(args.path),
+        'seed': args.seed,
+        'size': args.size,
+        **args.encoding._asdict(),
+    }
+    try:
+        if not hasattr(socket, 'AF_UNIX'):
+            raise ServerUnavailable('Unix sockets are not supported on this platform')
+        error = request(args.socket or default_socket_path(), payload)
+    except ServerUnavailable:
+        from circlemaker import draw_image
+
+        draw_image(args.d, args.hue, args.path, args.seed, args.encoding, args.size)
+        return 0
+    except OSError as e:  # the server may still draw the image, don't draw it a second time
+        error = f'the render server failed: {e}'
+
+    if error is not None:
+        print(f'error: {error}', file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
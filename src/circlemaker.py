@@ -1,31 +1,126 @@
 import argparse
+import functools
+import importlib.util
+import io
+import os
 import random
+import sys
+from contextlib import nullcontext
 
-from PIL import Image, ImageDraw
+import instrument
+from colors import WHITE, hue_rgb
+from encoders import FORMATS, PNG, Encoding, check_encoding, open_output, save_image
 
 CANVAS_SIZE = 400
+D_RANGE = (0, 399)
+HUE_RANGE = (0, 360)
+SIZE_RANGE = (3, 8192)
+STREAM_MIN_SIZE = 1024  # smaller canvases go through Pillow, byte-identical to the previous releases
 
 
-def draw_image(d, hue, output_path):
-    image = Image.new('RGB', (CANVAS_SIZE, CANVAS_SIZE), 'white')
+def d_range(canvas_size=CANVAS_SIZE):
+    """The diameters that fit a ``canvas_size`` canvas, ``D_RANGE`` for the default size."""
+    return (0, canvas_size - 1)
+
+
+def pick_border_hue(seed=None):
+    if seed is None:
+        return random.randint(0, 360)
+    return random.Random(seed).randint(0, 360)
+
+
+def palette_of(hue, border_hue):
+    """The palette of a P-mode circle image: the background, the circle and the border colors."""
+    return [*WHITE, *hue_rgb(hue), *hue_rgb(border_hue)]
+
+
+@instrument.timed('render')
+def render_image(d, hue, seed=None, palette=False, canvas_size=CANVAS_SIZE):
+    # Pillow is imported on first use, so that parsing and validating arguments stays cheap (see renderd.py)
+    from PIL import Image, ImageDraw
+
+    border_hue = pick_border_hue(seed)
+    background, fill, outline = WHITE, hue_rgb(hue), hue_rgb(border_hue)
+    with instrument.timer('render.allocate'):
+        if palette:
+            image = Image.new('P', (canvas_size, canvas_size), 0)
+            image.putpalette(palette_of(hue, border_hue))
+            background, fill, outline = 0, 1, 2
+        else:
+            image = Image.new('RGB', (canvas_size, canvas_size), background)
     draw = ImageDraw.Draw(image)
-    center = CANVAS_SIZE / 2
+    center = canvas_size / 2
     draw.ellipse(
         (center - d / 2, center - d / 2, center + d / 2, center + d / 2),
-        fill=f'hsv({hue}, 100%, 100%)'
+        fill=fill
     )
     draw.rectangle(
-        (0, 0, 399, 399),
-        outline=f'hsv({random.randint(0, 360)}, 100%, 100%)'
+        (0, 0, canvas_size - 1, canvas_size - 1),
+        outline=outline
     )
-    image.save(output_path, format='png')
+    return image
+
+
+@functools.lru_cache(maxsize=None)
+def _has_numpy():
+    """Return True if numpy can be imported, without importing it."""
+    return importlib.util.find_spec('numpy') is not None
+
+
+def streams(encoding, canvas_size):
+    """Return True if the images of ``encoding`` on a ``canvas_size`` canvas are written by ``streampng.write_png``.
+
+    ``streampng`` needs numpy, import it only when this is True. Without numpy
+    every canvas is drawn by Pillow, the same pixels at a higher cost.
+    """
+    return encoding.format == 'png' and canvas_size >= STREAM_MIN_SIZE and _has_numpy()
+
+
+def _write(d, hue, output, seed, encoding, canvas_size):
+    if streams(encoding, canvas_size):  # the work follows the circle, not the canvas (see streampng.py)
+        from streampng import write_png
+
+        with instrument.timer('render'):
+            write_png(output, d, hue, pick_border_hue(seed), canvas_size, encoding)
+    else:
+        save_image(render_image(d, hue, seed, encoding.palette, canvas_size), output, encoding)
+
+
+def render_bytes(d, hue, seed=None, encoding=PNG, canvas_size=CANVAS_SIZE):
+    output = io.BytesIO()
+    _write(d, hue, output, seed, encoding, canvas_size)
+    return output.getvalue()
+
+
+def render_array(d, hue, seed=None, channels='RGB', canvas_size=CANVAS_SIZE):
+    """Render a circle as a read-only ``(canvas_size, canvas_size, 3)`` uint8 numpy array.
+
+    ``channels='BGR'`` returns a view of the same pixels in the OpenCV channel
+    order, ready for ``CircleDetector``, without a second copy.
+    """
+    import numpy as np
+
+    if channels not in ('RGB', 'BGR'):
+        raise ValueError('channels must be either \'RGB\' or \'BGR\'')
+
+    array = np.asarray(render_image(d, hue, seed, canvas_size=canvas_size))
+    return array[..., ::-1] if channels == 'BGR' else array
+
+
+def draw_image(d, hue, output_path, seed=None, encoding=PNG, canvas_size=CANVAS_SIZE):
+    if streams(encoding, canvas_size):
+        with open_output(output_path) as output:
+            _write(d, hue, output, seed, encoding, canvas_size)
+    else:
+        _write(d, hue, output_path, seed, encoding, canvas_size)
 
 
 def float_in_range(vmin, vmax):
+    @instrument.timed('float_in_range')
     def _float_in_range(number):
         try:
             f = float(number)
-        except ValueError:
+        except (TypeError, ValueError):
             raise argparse.ArgumentTypeError(
                 'Argument must be a float type number')
 
@@ -38,15 +133,234 @@ def float_in_range(vmin, vmax):
     return _float_in_range
 
 
-if __name__ == '__main__':
+def int_at_least(vmin):
+    def _int_at_least(number):
+        try:
+            i = int(number)
+        except (TypeError, ValueError):
+            raise argparse.ArgumentTypeError(
+                'Argument must be an integer number')
+
+        if i < vmin:
+            raise argparse.ArgumentTypeError(
+                f'Argument must be >= {vmin}')
+
+        return i
+
+    return _int_at_least
+
+
+def int_in_range(vmin, vmax):
+    def _int_in_range(number):
+        i = int_at_least(vmin)(number)
+        if i > vmax:
+            raise argparse.ArgumentTypeError(
+                f'Argument must be within {vmin} <= arg <= {vmax}')
+
+        return i
+
+    return _int_in_range
+
+
+def peek_canvas_size(argv=None):
+    """Return the -size of a command line before parsing it, the -d range depends on it.
+
+    An invalid -size returns CANVAS_SIZE, the full parser reports it.
+    """
+    parser = argparse.ArgumentParser(add_help=False, allow_abbrev=False)
+    parser.add_argument('-size', type=str)
+    known, _ = parser.parse_known_args(argv)
+    try:
+        return CANVAS_SIZE if known.size is None else int_in_range(*SIZE_RANGE)(known.size)
+    except argparse.ArgumentTypeError:
+        return CANVAS_SIZE
+
+
+def peek_profile(argv=None):
+    """Return the -profile modes of a command line before parsing it, None without -profile.
+
+    The instrumentation is enabled before the full parse, so that the argument
+    validation (float_in_range) is timed too.
+
+    Raises:
+        ValueError: on an unknown mode.
+    """
+    parser = argparse.ArgumentParser(add_help=False, allow_abbrev=False)
+    parser.add_argument('-profile', nargs='?', const='timers')
+    known, _ = parser.parse_known_args(argv)
+    return None if known.profile is None else instrument.parse_modes(known.profile)
+
+
+def build_parser(canvas_size=CANVAS_SIZE):
     parser = argparse.ArgumentParser(description='Draw a circle')
     parser.add_argument(
-        '-d', type=float_in_range(0, 399), help='diameter of a circle')
+        '-d', type=float_in_range(*d_range(canvas_size)), help='diameter of a circle')
     parser.add_argument(
-        '-hue', type=float_in_range(0, 360),  help='hue of the HSV color of a circle')
+        '-hue', type=float_in_range(*HUE_RANGE),  help='hue of the HSV color of a circle')
     parser.add_argument(
         '-path', type=str, help='output path of generated image')
+    parser.add_argument(
+        '-seed', type=int_at_least(0),
+        help='seed of the random border hue, the same -d, -hue and -seed always give the same image')
+    parser.add_argument(
+        '-size', type=int_in_range(*SIZE_RANGE), default=CANVAS_SIZE,
+        help=f'width and height of the canvas, -d must be smaller, -batch jobs may set their own size '
+             f'(default: {CANVAS_SIZE})')
+    parser.add_argument(
+        '-format', choices=FORMATS, default='png',
+        help='output format, npy writes a raw RGB array (default: png)')
+    parser.add_argument(
+        '-compress-level', type=int_at_least(0), metavar='[0-9]',
+        help='zlib level of png outputs, 0 is the fastest and 9 the smallest (default: Pillow\'s 6)')
+    parser.add_argument(
+        '-palette', action='store_true',
+        help='write a palette (P-mode) png or bmp, one byte per pixel')
+    parser.add_argument(
+        '-batch', type=str, metavar='MANIFEST',
+        help='render every job of a CSV or JSON Lines manifest ("-" reads stdin)')
+    parser.add_argument(
+        '-scene', type=str, metavar='MANIFEST',
+        help='draw the circles of a CSV or JSON Lines scene manifest with x,y,d,hue fields into a single -path image')
+    parser.add_argument(
+        '-workers', type=int_at_least(0), default=1,
+        help='number of rendering processes for -batch, 0 uses every core (default: 1)')
+    parser.add_argument(
+        '-chunksize', type=int_at_least(1), default=16,
+        help='number of -batch jobs dispatched to a worker at once (default: 16)')
+    parser.add_argument(
+        '-pipeline', action='store_true',
+        help='stream -batch jobs through overlapping render, encode and write stages, -workers sets the encoding threads')
+    parser.add_argument(
+        '-archive', type=str, metavar='PATH',
+        help='write -batch images into one .tar, .zip or .npy archive with a PATH.index.csv sidecar')
+    parser.add_argument(
+        '-cache', type=str, metavar='DIR',
+        help='reuse the images of repeated -batch jobs from a render cache directory')
+    parser.add_argument(
+        '-cache-size', type=int_at_least(1), default=1024, metavar='MB',
+        help='size cap of the render cache, least recently used images are evicted first (default: 1024)')
+    parser.add_argument(
+        '-cache-link', action='store_true',
+        help='hard-link cached images to their output path instead of copying them')
+    parser.add_argument(
+        '-incremental', type=str, metavar='INDEX',
+        help='skip the -batch jobs whose output is unchanged since the run that wrote the INDEX file, and update it')
+    parser.add_argument(
+        '-force', action='store_true',
+        help='render every -incremental job even if its output is up to date')
+    parser.add_argument(
+        '-profile', nargs='?', const='timers', metavar='MODES',
+        help=f'print the latency of every stage at exit, MODES may add cprofile and tracemalloc (default: timers, '
+             f'also enabled by ${instrument.PROFILE_ENV})')
+    return parser
 
-    args = parser.parse_args()
 
-    draw_image(args.d, args.hue, args.path)
+def parse_args(argv=None, parser=None, profile=True):
+    parser = parser or build_parser(peek_canvas_size(argv))
+    if profile:
+        try:
+            modes = peek_profile(argv)
+        except ValueError as e:
+            parser.error(str(e))
+        if modes is not None:
+            instrument.enable(modes)
+    args = parser.parse_args(argv)
+
+    args.encoding = Encoding(args.format, args.compress_level, args.palette)
+    try:
+        check_encoding(args.encoding)
+    except ValueError as e:
+        parser.error(str(e))
+    if args.cache is not None and (args.pipeline or args.archive is not None):
+        parser.error('-cache cannot be combined with -pipeline or -archive')
+    if (args.archive is not None and os.path.splitext(args.archive)[1].lower() == '.npy'
+            and (args.format != 'png' or args.compress_level is not None or args.palette)):
+        parser.error('an .npy archive holds raw RGB frames, it cannot be combined with -format, -compress-level or -palette')
+    if args.incremental is not None and args.archive is not None:
+        parser.error('-incremental cannot be combined with -archive')
+    if args.force and args.incremental is None:
+        parser.error('-force can only be used with -incremental')
+    if args.scene is not None and (args.batch is not None or args.palette):
+        parser.error('-scene cannot be combined with -batch or -palette')
+    if args.scene is not None and args.path is None:
+        parser.error('-scene requires -path')
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    if args.batch is not None:
+        return _main_batch(args)
+    if args.scene is not None:
+        return _main_scene(args)
+
+    draw_image(args.d, args.hue, args.path, args.seed, args.encoding, args.size)
+    return 0
+
+
+def _main_scene(args):
+    from batch import read_manifest
+    from scene import draw_scene, read_scene
+
+    try:
+        if args.scene == '-':
+            circles = read_scene(read_manifest(sys.stdin), args.size)
+        else:
+            with open(args.scene, newline='') as manifest:
+                circles = read_scene(read_manifest(manifest), args.size)
+    except (OSError, ValueError) as e:
+        for message in str(e).splitlines():
+            print(f'error: {message}', file=sys.stderr)
+        return 2
+
+    draw_scene(circles, args.path, args.seed, args.encoding, args.size)
+    print(f'{len(circles)} circles drawn')
+    return 0
+
+
+def _main_batch(args):
+    from batch import read_manifest, run_batch
+    from cache import RenderCache
+    from incremental import BuildIndex
+    from sinks import open_sink
+
+    options = {
+        'workers': args.workers or os.cpu_count(),
+        'chunksize': args.chunksize,
+        'seed': args.seed,
+        'size': args.size,
+        'encoding': args.encoding,
+        'pipeline': args.pipeline,
+        'cache': None if args.cache is None else RenderCache(args.cache, args.cache_size * 1024 * 1024, args.cache_link),
+    }
+    try:
+        manifest = nullcontext(sys.stdin) if args.batch == '-' else open(args.batch, newline='')
+    except OSError as e:
+        print(f'error: {e}', file=sys.stderr)
+        return 2
+
+    with manifest as rows:
+        try:
+            sink = None if args.archive is None else open_sink(args.archive, args.encoding, args.size)
+            index = None if args.incremental is None else BuildIndex(args.incremental)
+        except (OSError, ValueError) as e:
+            print(f'error: {e}', file=sys.stderr)
+            return 2
+
+        try:
+            _, failed = run_batch(read_manifest(rows), sink=sink, index=index, force=args.force, **options)
+        except KeyboardInterrupt:
+            print('error: batch interrupted', file=sys.stderr)
+            return 130
+        finally:
+            if sink is not None:
+                sink.close()
+            if index is not None:
+                index.save()  # also keeps the progress of an interrupted run
+
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,94 @@
+"""Hue conversions shared by the renderer and the detector.
+
+The circles and their borders are fully saturated, full value HSV colors.
+Pillow turns an ``'hsv(h, 100%, 100%)'`` string into RGB by matching it with a
+regular expression and calling ``colorsys``, twice per image. ``hue_rgb``
+returns the very same (r, g, b) from a table of the 361 integer hues, and
+from the same arithmetic for fractional hues, without building or parsing any
+string. ``hue_rgb_array`` converts whole arrays of hues at once.
+
+The detector masks the circles in OpenCV's ``COLOR_BGR2HSV_FULL`` space, where
+hues are [0 255]. ``cv_hue`` is the hue OpenCV computes, with its 8-bit integer
+formula, from the RGB that is actually drawn, so both sides always agree. In
+particular a hue of 360, or close enough to be drawn pure red, is 0 like hue 0.
+"""
+import colorsys
+
+WHITE = (255, 255, 255)
+
+_CV_HSV_SHIFT = 12  # the fixed point precision of OpenCV's 8-bit RGB to HSV conversion
+_CV_HUE_RANGE = 256  # COLOR_*2HSV_FULL
+
+
+def _rgb(hue):
+    r, g, b = colorsys.hsv_to_rgb(hue / 360.0, 1.0, 1.0)
+    return int(r * 255 + 0.5), int(g * 255 + 0.5), int(b * 255 + 0.5)
+
+
+def _cv_hue(rgb):
+    r, g, b = rgb
+    v, diff = max(rgb), max(rgb) - min(rgb)
+    if diff == 0:
+        return 0
+    if v == r:
+        h = g - b
+    elif v == g:
+        h = b - r + 2 * diff
+    else:
+        h = r - g + 4 * diff
+    divisor = round((_CV_HUE_RANGE << _CV_HSV_SHIFT) / (6.0 * diff))
+    h = (h * divisor + (1 << (_CV_HSV_SHIFT - 1))) >> _CV_HSV_SHIFT
+    return h + _CV_HUE_RANGE if h < 0 else h
+
+
+_RGB_TABLE = tuple(_rgb(float(hue)) for hue in range(361))
+_CV_HUE_TABLE = tuple(_cv_hue(rgb) for rgb in _RGB_TABLE)
+
+
+def hue_rgb(hue):
+    """Return the (r, g, b) color Pillow draws for ``f'hsv({hue}, 100%, 100%)'``."""
+    if 0 <= hue <= 360 and hue == int(hue):
+        return _RGB_TABLE[int(hue)]
+    return _rgb(hue)
+
+
+def hue_bgr(hue):
+    """Return the (b, g, r) color of a hue, the channels order of OpenCV images."""
+    return hue_rgb(hue)[::-1]
+
+
+def cv_hue(hue):
+    """Return the OpenCV ``HSV_FULL`` hue, in [0 255], of the color drawn for a hue in [0 360]."""
+    if 0 <= hue <= 360 and hue == int(hue):
+        return _CV_HUE_TABLE[int(hue)]
+    return _cv_hue(_rgb(hue))
+
+
+def rgb_hsv(rgb):
+    """Return the (h, s, v) of an (r, g, b) color, h in [0 360) and s, v in [0 100] like ``'hsv(h, s%, v%)'``.
+
+    It inverts ``hue_rgb`` up to its rounding to 8 bits, a quarter of a degree at most.
+    """
+    h, s, v = colorsys.rgb_to_hsv(*(channel / 255.0 for channel in rgb))
+    return h * 360.0, s * 100.0, v * 100.0
+
+
+def hue_rgb_array(hues):
+    """Return the ``(N, 3)`` uint8 RGB colors of an array of hues, ``hue_rgb`` vectorized with numpy."""
+    import numpy as np
+
+    h = np.asarray(hues, dtype=np.float64).reshape(-1) / 360.0
+    # the same float operations as colorsys.hsv_to_rgb with s = v = 1, so the rounding is the same
+    sector = (h * 6.0).astype(np.int64)
+    f = h * 6.0 - sector
+    q, t = 1.0 - f, 1.0 - (1.0 - f)
+    one, zero = np.ones_like(h), np.zeros_like(h)
+    sectors = [(one, t, zero), (q, one, zero), (zero, one, t), (zero, q, one), (t, zero, one), (one, zero, q)]
+
+    rgb = np.empty((len(h), 3), dtype=np.float64)
+    sector %= 6
+    for i, channels in enumerate(sectors):
+        selected = sector == i
+        for channel, values in enumerate(channels):
+            rgb[selected, channel] = values[selected]
+    return (rgb * 255 + 0.5).astype(np.uint8)
@@ -0,0 +1,133 @@
+"""Output formats of the rendered images and their encoding knobs.
+
+A circle image only holds three flat colors (the background, the circle and
+the border), so most of the rendering time is spent in zlib. ``Encoding``
+trades disk size against encode throughput:
+
+* ``png`` with a zlib ``compress_level`` from 0 (store only) to 9 (smallest),
+* a ``palette`` (P-mode) PNG or BMP, one byte per pixel instead of three,
+* uncompressed ``bmp`` and ``ppm`` files,
+* a raw ``npy`` RGB array of shape ``(height, width, 3)``, which needs numpy,
+
+and, internally, headerless ``rgb`` bytes, the frames of ``.npy`` archives (see
+``sinks``). ``rgb`` is not in ``FORMATS``, so it cannot be asked for on the
+command line or from the render server.
+"""
+import io
+import os
+import stat
+from collections import namedtuple
+
+import instrument
+
+FORMATS = ('png', 'bmp', 'ppm', 'npy')
+PALETTE_FORMATS = ('png', 'bmp')
+
+Encoding = namedtuple('Encoding', ['format', 'compress_level', 'palette'], defaults=['png', None, False])
+Encoding.__doc__ = """How a rendered image is written.
+
+    Args:
+        format (string, optional): one of ``FORMATS``. Defaults to 'png'.
+        compress_level (int, optional): the PNG zlib level [0 9], None keeps Pillow's default. Defaults to None.
+        palette (bool, optional): write a P-mode image, only for ``PALETTE_FORMATS``. Defaults to False.
+"""
+
+PNG = Encoding()
+
+
+def check_encoding(encoding):
+    """Raise ValueError if ``encoding`` is not a valid combination of knobs."""
+    if encoding.format not in FORMATS:
+        raise ValueError(f'unknown format \'{encoding.format}\', must be one of {", ".join(FORMATS)}')
+    if encoding.compress_level is not None:
+        if encoding.format != 'png':
+            raise ValueError('a compress level can only be used with the png format')
+        if not (0 <= encoding.compress_level <= 9):
+            raise ValueError('the compress level must be within 0 <= level <= 9')
+    if encoding.palette and encoding.format not in PALETTE_FORMATS:
+        raise ValueError(f'a palette can only be used with the {" and ".join(PALETTE_FORMATS)} formats')
+
+
+def to_palette(image):
+    """Convert an RGB image with at most 256 colors to an exact P-mode image."""
+    from PIL import Image
+
+    colors = image.getcolors(256)
+    if colors is None:
+        raise ValueError('a palette image can hold at most 256 colors')
+
+    palette = Image.new('P', (1, 1))
+    palette.putpalette([channel for _, rgb in colors for channel in rgb])
+    return image.quantize(palette=palette, dither=Image.Dither.NONE)
+
+
+def detach_output(path):
+    """Unlink ``path`` if it is a hard link shared with another file.
+
+    A ``-cache-link`` hit hard-links the output path to a cache entry, writing
+    the path in place would then overwrite the entry too. Writing a detached
+    path creates a new file instead.
+    """
+    try:
+        info = os.lstat(path)
+    except OSError:
+        return
+    if stat.S_ISREG(info.st_mode) and info.st_nlink > 1:
+        os.unlink(path)
+
+
+def open_output(path):
+    """Open ``path`` for writing, see ``detach_output``."""
+    detach_output(path)
+    return open(path, 'wb')
+
+
+def save_image(image, output, encoding=PNG):
+    """Write ``image`` to a path or a binary file object following ``encoding``."""
+    if isinstance(output, str):
+        detach_output(output)
+    if not instrument.enabled():
+        _save_image(image, output, encoding)
+    elif isinstance(output, str):
+        # encode in memory first, so that the encoder and the disk are timed apart
+        buffer = io.BytesIO()
+        with instrument.timer('encode'):
+            _save_image(image, buffer, encoding)
+        with instrument.timer('write'):
+            with open(output, 'wb') as f:
+                f.write(buffer.getbuffer())
+    else:
+        with instrument.timer('encode'):
+            _save_image(image, output, encoding)
+
+
+def _save_image(image, output, encoding):
+    if encoding.format == 'npy':
+        import numpy as np
+
+        array = np.asarray(image.convert('RGB') if image.mode != 'RGB' else image)
+        if isinstance(output, str):
+            with open(output, 'wb') as f:
+                np.save(f, array)
+        else:
+            np.save(output, array)
+        return
+
+    if encoding.palette:
+        if image.mode != 'P':
+            image = to_palette(image)
+    elif image.mode != 'RGB':
+        image = image.convert('RGB')
+
+    if encoding.format == 'rgb':
+        if isinstance(output, str):
+            with open(output, 'wb') as f:
+                f.write(image.tobytes())
+        else:
+            output.write(image.tobytes())
+        return
+
+    params = {}
+    if encoding.compress_level is not None:
+        params['compress_level'] = encoding.compress_level
+    image.save(output, format=encoding.format, **params)
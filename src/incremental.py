@@ -0,0 +1,113 @@
+"""An index of the outputs of previous batch runs, to only re-render what changed.
+
+For every output path the index keeps a hash of the job parameters (``d``,
+``hue``, ``seed``, the canvas ``size`` and the encoding) and the sha256, size and modification time
+of the file that was written. A job is up to date, and skipped, when its
+parameters did not change and its output still holds the indexed bytes. The
+size and modification time are checked first, so the files of unchanged jobs
+are only hashed again when they were touched since the previous run.
+
+Jobs without a seed get a random border hue, their up to date output keeps the
+border of the run that wrote it.
+"""
+import hashlib
+import json
+import os
+import tempfile
+
+INDEX_VERSION = 1  # bump whenever the rendered output of the same parameters changes
+
+_HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(_HASH_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def params_key(job, encoding):
+    """Return the hash of the parameters that make the output of ``job``."""
+    params = [INDEX_VERSION, float(job.d), float(job.hue), job.seed, job.size, list(encoding)]
+    return hashlib.sha256(json.dumps(params).encode()).hexdigest()
+
+
+class BuildIndex:
+    """The outputs of previous runs, loaded from and saved to a JSON file.
+
+    Args:
+        path (string): the index file, a missing file is an empty index.
+
+    Raises:
+        ValueError: if the file is not an index, or its directory does not exist.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.unchanged = 0
+        self.__outputs = {}
+        if not os.path.isdir(os.path.dirname(os.path.abspath(path))):
+            raise ValueError(f'the directory of the index {path} does not exist')
+        try:
+            with open(path) as f:
+                index = json.load(f)
+        except FileNotFoundError:
+            return
+        except ValueError:
+            raise ValueError(f'{path} is not a build index')
+        if not isinstance(index, dict) or not isinstance(index.get('outputs'), dict):
+            raise ValueError(f'{path} is not a build index')
+        if index.get('version') == INDEX_VERSION:  # the outputs of another version are all rebuilt
+            self.__outputs = index['outputs']
+
+    def __len__(self):
+        return len(self.__outputs)
+
+    def is_current(self, job, encoding):
+        """Return True if the output of ``job`` is up to date, counting it in ``unchanged``."""
+        entry = self.__outputs.get(job.path)
+        if entry is None or entry['params'] != params_key(job, encoding):
+            return False
+        try:
+            stat = os.stat(job.path)
+            if stat.st_size != entry['size']:
+                return False
+            if stat.st_mtime_ns != entry['mtime_ns']:
+                if file_sha256(job.path) != entry['sha256']:
+                    return False
+                entry['mtime_ns'] = stat.st_mtime_ns
+        except OSError:
+            return False
+
+        self.unchanged += 1
+        return True
+
+    def update(self, job, encoding):
+        """Record the output ``job`` just wrote."""
+        try:
+            stat = os.stat(job.path)
+            self.__outputs[job.path] = {
+                'params': params_key(job, encoding),
+                'sha256': file_sha256(job.path),
+                'size': stat.st_size,
+                'mtime_ns': stat.st_mtime_ns,
+            }
+        except OSError:
+            self.forget(job.path)
+
+    def forget(self, path):
+        self.__outputs.pop(path, None)
+
+    def save(self):
+        """Write the index atomically, a crash never leaves a truncated index behind."""
+        directory = os.path.dirname(os.path.abspath(self.path))
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump({'version': INDEX_VERSION, 'outputs': self.__outputs}, f)
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
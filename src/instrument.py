@@ -0,0 +1,239 @@
+"""Optional timers and counters on the hot paths, printed at exit.
+
+Instrumentation is off by default and then costs a flag check per call. It is
+turned on by the ``-profile`` option or the ``CIRCLEMAKER_PROFILE`` environment
+variable, whose value is a comma separated list of modes:
+
+* ``timers`` (or ``1``): the latency of every stage (rendering with Pillow,
+  zlib encoding, disk writes, argument validation, the ``CircleDetector``
+  stages...) and the counters,
+* ``cprofile``: a ``cProfile`` run of the whole process,
+* ``tracemalloc``: the peak memory and the biggest allocation sites.
+
+At exit a per-stage latency table (count, total, p50, p95, p99, max) is
+printed to stderr. Only the calling process is measured, the ``-workers``
+processes of a batch are not.
+"""
+import atexit
+import contextlib
+import functools
+import math
+import os
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+
+PROFILE_ENV = 'CIRCLEMAKER_PROFILE'
+MODES = ('timers', 'cprofile', 'tracemalloc')
+
+_enabled = False
+_modes = ()
+_timings = defaultdict(list)
+_counters = Counter()
+_lock = threading.Lock()
+_profiler = None
+
+
+class _NullTimer:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+class _Timer:
+    __slots__ = ('stage', 'start')
+
+    def __init__(self, stage):
+        self.stage = stage
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        record(self.stage, time.perf_counter() - self.start)
+        return False
+
+
+_NULL_TIMER = _NullTimer()
+
+
+def enabled():
+    return _enabled
+
+
+def parse_modes(value):
+    """Parse a comma separated list of ``MODES``, ``1`` and ``true`` meaning ``timers``.
+
+    Raises:
+        ValueError: on an unknown mode.
+    """
+    modes = []
+    for mode in value.lower().split(','):
+        mode = mode.strip()
+        if mode in ('', '1', 'true'):
+            mode = 'timers'
+        if mode not in MODES:
+            raise ValueError(f'unknown profile mode \'{mode}\', must be one of {", ".join(MODES)}')
+        if mode not in modes:
+            modes.append(mode)
+    return tuple(modes)
+
+
+def enable(modes=('timers',)):
+    """Start collecting, the timers and counters are always on once enabled, and print the report at exit."""
+    global _enabled, _modes, _profiler
+    if _enabled:
+        return
+    _enabled, _modes = True, tuple(modes)
+    if 'tracemalloc' in _modes:
+        import tracemalloc
+
+        tracemalloc.start()
+    if 'cprofile' in _modes:
+        import cProfile
+
+        _profiler = cProfile.Profile()
+        _profiler.enable()
+    atexit.register(report)
+
+
+def reset():
+    """Stop collecting and forget everything collected so far."""
+    global _enabled, _modes, _profiler
+    if _profiler is not None:
+        _profiler.disable()
+        _profiler = None
+    if 'tracemalloc' in _modes:
+        import tracemalloc
+
+        tracemalloc.stop()
+    atexit.unregister(report)
+    _enabled, _modes = False, ()
+    _timings.clear()
+    _counters.clear()
+
+
+@contextlib.contextmanager
+def isolated():
+    """Collect the timers and counters of the block on their own, call ``stats()`` inside it.
+
+    A session enabled before (by ``-profile`` or ``CIRCLEMAKER_PROFILE``) is put
+    back as it was on exit, the block's samples are not added to it.
+    """
+    global _enabled
+    with _lock:
+        saved = (_enabled, dict(_timings), Counter(_counters))
+        _timings.clear()
+        _counters.clear()
+        _enabled = True
+    try:
+        yield
+    finally:
+        with _lock:
+            _enabled = saved[0]
+            _timings.clear()
+            _timings.update(saved[1])
+            _counters.clear()
+            _counters.update(saved[2])
+
+
+def record(stage, seconds):
+    with _lock:
+        _timings[stage].append(seconds)
+
+
+def timer(stage):
+    """A context manager timing its block as ``stage``, a shared no-op one while disabled."""
+    if not _enabled:
+        return _NULL_TIMER
+    return _Timer(stage)
+
+
+def timed(stage):
+    """Decorate a function so that its calls are timed as ``stage``."""
+
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return func(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                record(stage, time.perf_counter() - start)
+
+        return wrapper
+
+    return decorator
+
+
+def count(name, n=1):
+    if _enabled:
+        with _lock:
+            _counters[name] += n
+
+
+def percentile(values, q):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, math.ceil(q / 100 * len(ordered)) - 1)]
+
+
+def stats():
+    """Return ``{stage: {count, total, p50, p95, p99, max}}`` in seconds, and the counters."""
+    with _lock:
+        timings = {stage: list(samples) for stage, samples in _timings.items()}
+        counters = dict(_counters)
+    summary = {
+        stage: {
+            'count': len(samples),
+            'total': sum(samples),
+            'p50': percentile(samples, 50),
+            'p95': percentile(samples, 95),
+            'p99': percentile(samples, 99),
+            'max': max(samples),
+        }
+        for stage, samples in sorted(timings.items())
+    }
+    return summary, counters
+
+
+def report(output=None):
+    """Print the latency table, the counters and the cProfile and tracemalloc results."""
+    output = output or sys.stderr
+    summary, counters = stats()
+    print(f'{"stage":<24} {"count":>7} {"total ms":>10} {"p50 ms":>9} {"p95 ms":>9} {"p99 ms":>9} {"max ms":>9}', file=output)
+    for stage, s in summary.items():
+        print(f'{stage:<24} {s["count"]:>7} {s["total"] * 1000:>10.3f} {s["p50"] * 1000:>9.3f} {s["p95"] * 1000:>9.3f} '
+              f'{s["p99"] * 1000:>9.3f} {s["max"] * 1000:>9.3f}', file=output)
+    for name, value in sorted(counters.items()):
+        print(f'{name:<24} {value:>7}', file=output)
+
+    if _profiler is not None:
+        import pstats
+
+        _profiler.disable()
+        pstats.Stats(_profiler, stream=output).sort_stats('cumulative').print_stats(20)
+    if 'tracemalloc' in _modes:
+        import tracemalloc
+
+        current, peak = tracemalloc.get_traced_memory()
+        print(f'memory: {current / 1024:.1f} KiB allocated, {peak / 1024:.1f} KiB peak', file=output)
+        for statistic in tracemalloc.take_snapshot().statistics('lineno')[:10]:
+            print(f'  {statistic}', file=output)
+
+
+def enable_from_env():
+    """Enable the modes of the ``CIRCLEMAKER_PROFILE`` environment variable, if it is set, as done at import."""
+    if os.environ.get(PROFILE_ENV, '') not in ('', '0'):
+        try:
+            enable(parse_modes(os.environ[PROFILE_ENV]))
+        except ValueError as e:  # a typo in the environment must not break every import
+            print(f'warning: {PROFILE_ENV}: {e}', file=sys.stderr)
+
+
+enable_from_env()
@@ -0,0 +1,152 @@
+"""A streaming batch mode where rendering, encoding and writing overlap.
+
+The jobs flow through three stages connected by bounded queues:
+
+* a render thread reads the manifest lazily and draws every circle,
+* a thread pool encodes the images (zlib releases the GIL, so the encoders run
+  in parallel with each other and with the renderer),
+* a writer thread writes the encoded images to disk, or into an archive
+  sink, in manifest order.
+
+A full queue blocks the stage feeding it, so the memory use stays flat however
+long the manifest is, while disk I/O overlaps with the CPU work.
+"""
+import io
+import os
+import queue
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from batch import JobResult, parse_job
+from canvas import CanvasRenderer
+from circlemaker import CANVAS_SIZE, pick_border_hue, streams
+from encoders import PNG, open_output, save_image
+
+_DONE = object()
+_POLL_SECONDS = 0.1
+
+
+class _Fatal:
+    """Wraps an error that stops the whole pipeline, e.g. an unreadable manifest."""
+
+    def __init__(self, error):
+        self.error = error
+
+
+def _encode(image, encoding):
+    output = io.BytesIO()
+    save_image(image, output, encoding)
+    return output.getvalue()
+
+
+def _stream(job, border_hue, encoding):
+    from streampng import write_png
+
+    output = io.BytesIO()
+    write_png(output, job.d, job.hue, border_hue, job.size, encoding)
+    return output.getvalue()
+
+
+def stream_results(entries, threads=None, queue_size=None, seed=None, encoding=PNG, sink=None, size=CANVAS_SIZE):
+    """Render ``(line, fields)`` entries through the pipeline and yield their ``JobResult`` in manifest order.
+
+    Args:
+        entries (iterable): the manifest entries as yielded by ``batch.read_manifest``.
+        threads (int, optional): number of encoding threads. Defaults to the number of cores.
+        queue_size (int, optional): capacity of the queues between the stages. Defaults to twice the threads.
+        seed (int, optional): the seed of jobs without their own ``seed`` field. Defaults to None.
+        encoding (Encoding, optional): the output format of every job. Defaults to PNG.
+        sink (optional): an archive sink the writer appends to instead of writing separate files. Defaults to None.
+        size (int, optional): the canvas size of jobs without their own ``size`` field. Defaults to CANVAS_SIZE.
+    """
+    threads = threads or os.cpu_count()
+    queue_size = queue_size or 2 * threads
+    encoded = queue.Queue(queue_size)  # (line, job, border hue, Future or error) in manifest order
+    written = queue.Queue(queue_size)  # JobResult in manifest order
+    stop = threading.Event()
+    executor = ThreadPoolExecutor(threads)
+
+    def put(target, item):
+        while not stop.is_set():
+            try:
+                target.put(item, timeout=_POLL_SECONDS)
+                return
+            except queue.Full:
+                pass
+
+    def get(source):
+        while not stop.is_set():
+            try:
+                return source.get(timeout=_POLL_SECONDS)
+            except queue.Empty:
+                pass
+        return _DONE
+
+    def render_stage():
+        renderers = {}  # per canvas size
+        try:
+            for line, fields in entries:
+                if stop.is_set():
+                    return
+                try:
+                    job = parse_job(fields, seed, size)
+                except ValueError as e:
+                    put(encoded, (line, None, None, e))
+                    continue
+                try:
+                    border_hue = pick_border_hue(job.seed)
+                    if streams(encoding, job.size):  # streamed row by row in the encoding thread
+                        put(encoded, (line, job, border_hue, executor.submit(_stream, job, border_hue, encoding)))
+                        continue
+                    renderer = renderers.get(job.size)
+                    if renderer is None:
+                        renderer = renderers[job.size] = CanvasRenderer(job.size, encoding.palette)
+                    image = renderer.render(job.d, job.hue, border_hue).copy()
+                except Exception as e:
+                    put(encoded, (line, job, None, e))
+                    continue
+                put(encoded, (line, job, border_hue, executor.submit(_encode, image, encoding)))
+        except BaseException as e:
+            put(encoded, _Fatal(e))
+        finally:
+            put(encoded, _DONE)
+
+    def write_stage():
+        while True:
+            item = get(encoded)
+            if item is _DONE or isinstance(item, _Fatal):
+                put(written, item)
+                return
+
+            line, job, border_hue, payload = item
+            error = payload
+            if isinstance(payload, Future):
+                try:
+                    data = payload.result()
+                    if sink is None:
+                        with open_output(job.path) as f:
+                            f.write(data)
+                    else:
+                        sink.write(job, border_hue, data)
+                    error = None
+                except Exception as e:  # Pillow and OS errors only fail this job
+                    error = e
+            put(written, JobResult(line, job, error, border_hue=border_hue))
+
+    stages = [threading.Thread(target=stage, daemon=True) for stage in (render_stage, write_stage)]
+    for stage in stages:
+        stage.start()
+
+    try:
+        while True:
+            item = written.get()
+            if item is _DONE:
+                return
+            if isinstance(item, _Fatal):
+                raise item.error
+            yield item
+    finally:
+        stop.set()
+        for stage in stages:
+            stage.join()
+        executor.shutdown(wait=True)
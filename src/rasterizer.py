@@ -0,0 +1,135 @@
+"""A vectorized numpy rasterizer drawing whole stacks of circles at once.
+
+``render_stack`` renders K circles as a single ``(K, CANVAS_SIZE, CANVAS_SIZE, 3)``
+uint8 array with broadcasted masks instead of K Pillow draw calls.
+
+Pillow truncates the ellipse bounding box to integers and walks the quarter
+ellipse in half-pixel units, keeping for every row the point closest to the
+curve. Each row of a filled ellipse is therefore a span centred on the box
+whose half width only depends on the box size. ``row_half_widths`` replays
+that walk once per box size (and caches it), so the mask of a circle is a
+per-row distance-from-center threshold and the output is pixel-identical to
+``draw_image``: the documented tolerance is 0 mismatched pixels.
+
+``circle_mask`` exposes the mask of a single circle, e.g. to verify a rendered
+image against its expected geometry without detecting anything.
+"""
+import functools
+
+import numpy as np
+
+from circlemaker import CANVAS_SIZE, pick_border_hue
+from colors import hue_rgb_array
+
+_MAX_CACHED_SIZE = 1024
+
+
+def _delta(a2, a2b2, x, y):
+    return abs(a2 * y * y + a2 * x * x - a2b2)
+
+
+@functools.lru_cache(maxsize=None)
+def row_half_widths(a):
+    """Return the half widths, in half pixels, of the rows of a filled circle with an ``a`` pixels wide box.
+
+    Row ``i`` of the box spans the columns ``x`` where ``|2 * x - a| <= widths[i]``.
+    """
+    a2 = a * a
+    a2b2 = a2 * a2
+    x, y, end = a, a % 2, (a % 2, a)
+    levels = {}
+    while True:
+        levels.setdefault(y, x)
+        if (x, y) == end:
+            break
+        nx, ny = x, y + 2
+        ndelta = _delta(a2, a2b2, nx, ny)
+        if nx > 1:
+            newdelta = _delta(a2, a2b2, x - 2, y + 2)
+            if ndelta > newdelta:
+                nx, ny, ndelta = x - 2, y + 2, newdelta
+            newdelta = _delta(a2, a2b2, x - 2, y)
+            if ndelta > newdelta:
+                nx, ny = x - 2, y
+        x, y = nx, ny
+
+    widths = np.array([levels[abs(2 * i - a)] for i in range(a + 1)], dtype=np.int32)
+    widths.setflags(write=False)
+    return widths
+
+
+def circle_box(d, canvas_size):
+    """Return the first column and the size ``a`` of the bounding box Pillow draws a ``d`` circle in."""
+    center = canvas_size / 2
+    x0, x1 = int(center - d / 2), int(center + d / 2)
+    return x0, x1 - x0
+
+
+@functools.lru_cache(maxsize=512)
+def _box_mask(x0, a, canvas_size):
+    widths = np.full(canvas_size, -1, dtype=np.int32)
+    if a > 0:  # Pillow draws nothing for an empty box
+        widths[x0:x0 + a + 1] = row_half_widths(a)
+    columns = 2 * np.arange(canvas_size, dtype=np.int32)
+    mask = np.abs(columns[None, :] - (2 * x0 + a)) <= widths[:, None]
+    mask.setflags(write=False)
+    return mask
+
+
+def circle_mask(d, canvas_size=CANVAS_SIZE):
+    """Return the read-only ``(canvas_size, canvas_size)`` bool mask of the pixels filled by a ``d`` circle.
+
+    The masks are cached per bounding box, so the diameters truncated to the same box share one mask. The
+    masks of canvases bigger than ``_MAX_CACHED_SIZE`` (up to 64 MiB each) are not cached.
+    """
+    if canvas_size > _MAX_CACHED_SIZE:
+        return _box_mask.__wrapped__(*circle_box(d, canvas_size), canvas_size)
+    return _box_mask(*circle_box(d, canvas_size), canvas_size)
+
+
+def render_stack(ds, hues, seeds=None, border_hues=None, canvas_size=CANVAS_SIZE):
+    """Render a stack of circles.
+
+    Args:
+        ds (sequence): the diameter of every circle.
+        hues (sequence): the hue of every circle.
+        seeds (sequence, optional): the seed of every border hue, see ``pick_border_hue``. Defaults to None.
+        border_hues (sequence, optional): explicit border hues, they take precedence over ``seeds``. Defaults to None.
+        canvas_size (int, optional): the canvas width and height. Defaults to CANVAS_SIZE.
+
+    Returns:
+        numpy.ndarray: a ``(K, canvas_size, canvas_size, 3)`` uint8 RGB array.
+    """
+    count = len(ds)
+    if len(hues) != count:
+        raise ValueError('ds and hues must have the same length')
+    if border_hues is None:
+        seeds = [None] * count if seeds is None else seeds
+        border_hues = [pick_border_hue(seed) for seed in seeds]
+    if len(border_hues) != count:
+        raise ValueError('ds and the border hues or seeds must have the same length')
+
+    # per circle: twice the box center, and the half width of every canvas row (-1 outside the circle)
+    dtype = np.int16 if 2 * canvas_size <= np.iinfo(np.int16).max else np.int32
+    centers = np.empty(count, dtype=dtype)
+    widths = np.full((count, canvas_size), -1, dtype=dtype)
+    for k, d in enumerate(ds):
+        x0, a = circle_box(d, canvas_size)
+        centers[k] = 2 * x0 + a
+        if a > 0:  # Pillow draws nothing for an empty box
+            widths[k, x0:x0 + a + 1] = row_half_widths(a)
+
+    columns = 2 * np.arange(canvas_size, dtype=dtype)
+    mask = np.abs(columns[None, None, :] - centers[:, None, None]) <= widths[:, :, None]
+
+    stack = np.full((count, canvas_size, canvas_size, 3), 255, dtype=np.uint8)
+    fills = hue_rgb_array(hues)
+    for channel in range(3):  # one masked copy per channel is much faster than a broadcast over the RGB axis
+        np.copyto(stack[..., channel], fills[:, channel, None, None], where=mask)
+
+    borders = hue_rgb_array(border_hues)[:, None, :]
+    stack[:, 0] = borders
+    stack[:, -1] = borders
+    stack[:, :, 0] = borders
+    stack[:, :, -1] = borders
+    return stack
@@ -0,0 +1,108 @@
+"""A long-lived local render server, kept warm for ``circleclient.py``.
+
+A single ``circlemaker.py`` launch spends most of its wall time starting the
+interpreter and importing Pillow before drawing anything. The server pays that
+once and then renders requests coming over a Unix socket, one JSON line per
+connection::
+
+    {"d": 89, "hue": 89, "path": "/abs/test.png", "seed": null, "size": 400, "format": "png", "compress_level": null, "palette": false}
+
+and answers ``{"error": null}`` or ``{"error": "<message>"}``. The arguments
+are validated again with ``float_in_range``, so the server can be fed by
+other clients than ``circleclient.py``.
+
+Usage:
+    python renderd.py [-socket PATH]
+"""
+import argparse
+import getpass
+import json
+import os
+import socket
+import socketserver
+import sys
+import tempfile
+
+from circlemaker import (CANVAS_SIZE, D_RANGE, HUE_RANGE, SIZE_RANGE, d_range, draw_image, float_in_range,
+                         int_at_least, int_in_range, render_image)
+from encoders import Encoding, check_encoding
+
+SOCKET_ENV = 'CIRCLEMAKER_SOCKET'
+
+_check_d = float_in_range(*D_RANGE)
+_check_hue = float_in_range(*HUE_RANGE)
+_check_seed = int_at_least(0)
+_check_size = int_in_range(*SIZE_RANGE)
+
+
+def default_socket_path():
+    return os.environ.get(SOCKET_ENV) or os.path.join(tempfile.gettempdir(), f'circlemaker-{getpass.getuser()}.sock')
+
+
+def handle_request(request):
+    """Render one decoded request, raising ValueError or OSError on failure."""
+    try:
+        size = CANVAS_SIZE if request.get('size') is None else _check_size(request['size'])
+        d = (_check_d if size == CANVAS_SIZE else float_in_range(*d_range(size)))(request.get('d'))
+        hue = _check_hue(request.get('hue'))
+        seed = None if request.get('seed') is None else _check_seed(request['seed'])
+    except argparse.ArgumentTypeError as e:
+        raise ValueError(str(e))
+
+    path = request.get('path')
+    if not isinstance(path, str) or not os.path.isabs(path):
+        raise ValueError('path must be an absolute path')
+
+    encoding = Encoding(request.get('format', 'png'), request.get('compress_level'), bool(request.get('palette')))
+    check_encoding(encoding)
+
+    draw_image(d, hue, path, seed, encoding, size)
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    def handle(self):
+        try:
+            handle_request(json.loads(self.rfile.readline()))
+            response = {'error': None}
+        except Exception as e:  # every failure goes back to the client, the server keeps running
+            response = {'error': str(e)}
+        self.wfile.write(json.dumps(response).encode() + b'\n')
+
+
+class RenderServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, socket_path):
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)  # a stale socket of a previous server
+        super().__init__(socket_path, _Handler)
+        render_image(0, 0)  # warm up Pillow before the first request
+
+    def server_close(self):
+        super().server_close()
+        try:
+            os.unlink(self.server_address)
+        except FileNotFoundError:
+            pass
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Serve circle renders over a Unix socket')
+    parser.add_argument(
+        '-socket', type=str, default=None, help=f'socket path (default: ${SOCKET_ENV} or a per-user path in the temp directory)')
+    args = parser.parse_args(argv)
+
+    if not hasattr(socket, 'AF_UNIX'):
+        print('error: Unix sockets are not supported on this platform', file=sys.stderr)
+        return 1
+
+    with RenderServer(args.socket or default_socket_path()) as server:
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
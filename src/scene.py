@@ -0,0 +1,179 @@
+"""Scenes: many circles at given positions on one canvas.
+
+A scene manifest is a CSV file with a ``x,y,d,hue`` header or a JSON Lines
+file with one ``{"x": ..., "y": ..., "d": ..., "hue": ...}`` object per line,
+``x`` and ``y`` being the center of the circle. The circles must fit inside the
+border and must not overlap: they are kept at least ``MIN_GAP`` pixels apart
+so that every circle stays a separate connected component once rasterized.
+
+The overlap checks go through ``SpatialGrid``: the circles are bucketed by
+size class (diameters within a power of two), each class in a uniform grid
+whose cells are as big as its biggest circle. A circle can only touch the
+circles of a class centered in the few cells within its reach, so placing
+thousands of circles costs a few distance checks each instead of one per
+circle already placed, and a few big circles don't make every cell big.
+"""
+import argparse
+import random
+from collections import namedtuple
+
+import instrument
+from circlemaker import CANVAS_SIZE, HUE_RANGE, float_in_range, pick_border_hue
+from colors import WHITE, hue_rgb
+from encoders import PNG, save_image
+
+Circle = namedtuple('Circle', ['x', 'y', 'd', 'hue'])
+
+REQUIRED_FIELDS = ('x', 'y', 'd', 'hue')
+MIN_GAP = 3  # pixels between two circles, Pillow's truncated boxes grow a circle by up to 1px, they never touch
+
+_check_hue = float_in_range(*HUE_RANGE)
+
+
+class SpatialGrid:
+    """Uniform grids of circles, one per size class, for overlap queries.
+
+    Args:
+        gap (float, optional): the distance two circles must keep. Defaults to MIN_GAP.
+    """
+
+    def __init__(self, gap=MIN_GAP):
+        self.gap = gap
+        self.__classes = {}  # size class -> (cell size, {cell: [(order, circle, item)]})
+        self.__count = 0
+
+    def __len__(self):
+        return self.__count
+
+    @staticmethod
+    def __size_class(d):
+        """The diameters of class ``k`` are within [2 ** (k - 1), 2 ** k)."""
+        return int(d).bit_length()
+
+    def overlapping(self, circle):
+        """Return the first added ``(circle, item)`` closer to ``circle`` than the gap, None if there is none."""
+        first = None
+        for size_class, (cell_size, cells) in self.__classes.items():
+            reach = (circle.d + 2 ** size_class) / 2 + self.gap  # the farthest center of a touching circle of the class
+            i0, i1 = int((circle.x - reach) // cell_size), int((circle.x + reach) // cell_size)
+            j0, j1 = int((circle.y - reach) // cell_size), int((circle.y + reach) // cell_size)
+            if (i1 - i0 + 1) * (j1 - j0 + 1) > len(cells):  # e.g. a big circle among small ones
+                buckets = cells.values()
+            else:
+                buckets = (cells.get((i, j), ()) for i in range(i0, i1 + 1) for j in range(j0, j1 + 1))
+            for bucket in buckets:
+                for order, other, item in bucket:
+                    distance = (circle.d + other.d) / 2 + self.gap
+                    if (circle.x - other.x) ** 2 + (circle.y - other.y) ** 2 < distance * distance:
+                        if first is None or order < first[0]:
+                            first = order, other, item
+        return None if first is None else first[1:]
+
+    def add(self, circle, item=None):
+        size_class = self.__size_class(circle.d)
+        if size_class not in self.__classes:
+            self.__classes[size_class] = (2 ** size_class + self.gap, {})
+        cell_size, cells = self.__classes[size_class]
+        cells.setdefault((int(circle.x // cell_size), int(circle.y // cell_size)), []).append((self.__count, circle, item))
+        self.__count += 1
+
+
+def parse_circle(fields, canvas_size=CANVAS_SIZE):
+    """Validate a scene manifest entry and turn it into a ``Circle``.
+
+    Raises:
+        ValueError: if a field is missing, malformed or the circle does not fit inside the border.
+    """
+    if isinstance(fields, Exception):
+        raise fields
+
+    for name in REQUIRED_FIELDS:
+        if fields.get(name) in (None, ''):
+            raise ValueError(f'missing field \'{name}\'')
+
+    values = {}
+    for name, check in (('d', float_in_range(0, canvas_size - 2)), ('x', float_in_range(1, canvas_size - 1)),
+                        ('y', float_in_range(1, canvas_size - 1)), ('hue', _check_hue)):
+        try:
+            values[name] = check(fields[name])
+        except argparse.ArgumentTypeError as e:
+            raise ValueError(f'field {name}: {e}')
+
+    circle = Circle(**values)
+    if min(circle.x, circle.y) - circle.d / 2 < 1 or max(circle.x, circle.y) + circle.d / 2 > canvas_size - 1:
+        raise ValueError('the circle overlaps the border')
+    return circle
+
+
+def read_scene(entries, canvas_size=CANVAS_SIZE):
+    """Return the circles of ``(line, fields)`` entries, see ``batch.read_manifest``.
+
+    Raises:
+        ValueError: listing the line and the reason of every invalid or overlapping circle.
+    """
+    parsed, errors = [], []
+    for line, fields in entries:
+        try:
+            parsed.append((line, parse_circle(fields, canvas_size)))
+        except ValueError as e:
+            errors.append(f'line {line}: {e}')
+
+    grid = SpatialGrid()
+    for line, circle in parsed:
+        overlap = grid.overlapping(circle)
+        if overlap is not None:
+            errors.append(f'line {line}: the circle overlaps the circle of line {overlap[1]}')
+            continue
+        grid.add(circle, line)
+
+    if errors:
+        raise ValueError('\n'.join(errors))
+    return [circle for _, circle in parsed]
+
+
+def random_scene(count, canvas_size=CANVAS_SIZE, d_range=(4, 16), seed=None, max_attempts=100):
+    """Place ``count`` random non-overlapping circles, e.g. to build dense images for the detection benchmarks.
+
+    Args:
+        count (int): the number of circles.
+        canvas_size (int, optional): the canvas width and height. Defaults to CANVAS_SIZE.
+        d_range (tuple, optional): the smallest and the biggest diameter. Defaults to (4, 16).
+        seed (int, optional): the seed of the positions, diameters and hues. Defaults to None.
+        max_attempts (int, optional): the random positions tried per circle. Defaults to 100.
+
+    Raises:
+        ValueError: if a circle can't be placed, the canvas is too crowded.
+    """
+    rng = random.Random(seed)
+    grid = SpatialGrid()
+    circles = []
+    for _ in range(count):
+        d = rng.uniform(*d_range)
+        for _ in range(max_attempts):
+            low, high = 1 + d / 2, canvas_size - 1 - d / 2
+            circle = Circle(rng.uniform(low, high), rng.uniform(low, high), d, rng.uniform(*HUE_RANGE))
+            if grid.overlapping(circle) is None:
+                break
+        else:
+            raise ValueError(f'no room left for circle {len(circles) + 1} of {count} after {max_attempts} attempts')
+        grid.add(circle)
+        circles.append(circle)
+    return circles
+
+
+@instrument.timed('render.scene')
+def render_scene(circles, seed=None, canvas_size=CANVAS_SIZE):
+    """Draw the circles of a scene on an RGB canvas, with a random border like ``render_image``."""
+    from PIL import Image, ImageDraw
+
+    image = Image.new('RGB', (canvas_size, canvas_size), WHITE)
+    draw = ImageDraw.Draw(image)
+    for x, y, d, hue in circles:
+        draw.ellipse((x - d / 2, y - d / 2, x + d / 2, y + d / 2), fill=hue_rgb(hue))
+    draw.rectangle((0, 0, canvas_size - 1, canvas_size - 1), outline=hue_rgb(pick_border_hue(seed)))
+    return image
+
+
+def draw_scene(circles, output_path, seed=None, encoding=PNG, canvas_size=CANVAS_SIZE):
+    save_image(render_scene(circles, seed, canvas_size), output_path, encoding)
+
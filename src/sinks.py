@@ -0,0 +1,165 @@
+"""Archive outputs: write a whole batch into one container file.
+
+Millions of tiny files are hard on a file system's metadata, so a batch can be
+written into a single archive instead, picked by its extension:
+
+* ``.tar`` and ``.zip`` (stored, not compressed) archives of encoded images
+  whose member names are the jobs' paths,
+* ``.npy``, one memory-mappable ``(N, height, width, 3)`` uint8 array of raw
+  RGB frames, see ``open_array``.
+
+Next to the archive a sidecar ``<archive>.index.csv`` lists every image with
+its ``d``, ``hue``, ``border_hue``, ``seed`` and the ``offset`` and ``size``
+of its bytes in the archive, so a reader can seek straight to any circle.
+"""
+import csv
+import io
+import os
+import tarfile
+import zipfile
+
+from circlemaker import CANVAS_SIZE
+from encoders import PNG, Encoding
+
+INDEX_SUFFIX = '.index.csv'
+INDEX_COLUMNS = ('name', 'd', 'hue', 'border_hue', 'seed', 'offset', 'size')
+ARCHIVE_FORMATS = ('.tar', '.zip', '.npy')
+
+_NPY_HEADER_SIZE = 128  # fixed, so the shape can be rewritten in place once the number of frames is known
+
+
+class _Sink:
+    encoding = PNG
+
+    def __init__(self, path):
+        self.path = path
+        self.count = 0
+        self._index_file = open(path + INDEX_SUFFIX, 'w', newline='')
+        self._index = csv.writer(self._index_file)
+        self._index.writerow(INDEX_COLUMNS)
+
+    def write(self, job, border_hue, data):
+        """Append the encoded image ``data`` of ``job`` to the archive."""
+        offset = self._append(job.path, data)
+        self._index.writerow((job.path, job.d, job.hue, border_hue, '' if job.seed is None else job.seed, offset, len(data)))
+        self.count += 1
+
+    def close(self):
+        self._close()
+        self._index_file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class TarSink(_Sink):
+    def __init__(self, path, encoding=PNG):
+        super().__init__(path)
+        self.encoding = encoding
+        self._tar = tarfile.open(path, 'w')
+
+    def _append(self, name, data):
+        info = tarfile.TarInfo(name)
+        info.size = len(data)
+        self._tar.addfile(info, io.BytesIO(data))
+        # the data is padded to whole blocks right before the end of the archive
+        blocks = -(-len(data) // tarfile.BLOCKSIZE)
+        return self._tar.offset - blocks * tarfile.BLOCKSIZE
+
+    def _close(self):
+        self._tar.close()
+
+
+class ZipSink(_Sink):
+    def __init__(self, path, encoding=PNG):
+        super().__init__(path)
+        self.encoding = encoding
+        self._zip = zipfile.ZipFile(path, 'w', zipfile.ZIP_STORED)
+
+    def _append(self, name, data):
+        self._zip.writestr(name, data)
+        info = self._zip.infolist()[-1]
+        # the data follows the 30 bytes local file header, the file name and the extra field
+        return info.header_offset + 30 + len(info.filename.encode()) + len(info.extra)
+
+    def _close(self):
+        self._zip.close()
+
+
+class ArraySink(_Sink):
+    """Frames of raw RGB bytes behind an ``.npy`` header."""
+
+    encoding = Encoding('rgb')
+
+    def __init__(self, path, canvas_size=CANVAS_SIZE):
+        super().__init__(path)
+        self._shape = (canvas_size, canvas_size, 3)
+        self._frame_size = canvas_size * canvas_size * 3
+        self._file = open(path, 'wb')
+        self._write_header()
+
+    def _append(self, name, data):
+        if len(data) != self._frame_size:
+            raise ValueError(f'a frame of {self.path} must hold {self._frame_size} bytes, not {len(data)}')
+        offset = self._file.tell()
+        self._file.write(data)
+        return offset
+
+    def _close(self):
+        self._write_header()
+        self._file.close()
+
+    def _write_header(self):
+        position = self._file.tell()
+        header = repr({'descr': '|u1', 'fortran_order': False, 'shape': (self.count, *self._shape)})
+        header = header.ljust(_NPY_HEADER_SIZE - 10 - 1) + '\n'  # 10 bytes of magic, version and header length
+        self._file.seek(0)
+        self._file.write(b'\x93NUMPY\x01\x00' + len(header).to_bytes(2, 'little') + header.encode('latin1'))
+        if position:
+            self._file.seek(position)
+
+
+def open_sink(path, encoding=PNG, canvas_size=CANVAS_SIZE):
+    """Open the archive sink matching the extension of ``path``.
+
+    Raises:
+        ValueError: if the extension is not one of ``ARCHIVE_FORMATS``.
+    """
+    extension = os.path.splitext(path)[1].lower()
+    if extension == '.tar':
+        return TarSink(path, encoding)
+    if extension == '.zip':
+        return ZipSink(path, encoding)
+    if extension == '.npy':
+        return ArraySink(path, canvas_size)
+    raise ValueError(f'unknown archive format \'{extension}\', must be one of {", ".join(ARCHIVE_FORMATS)}')
+
+
+def read_index(path):
+    """Return the sidecar index rows of the archive at ``path`` as dictionaries."""
+    with open(path + INDEX_SUFFIX, newline='') as f:
+        rows = list(csv.DictReader(f))
+    for row in rows:
+        for column in ('d', 'hue'):
+            row[column] = float(row[column])
+        for column in ('border_hue', 'offset', 'size'):
+            row[column] = int(row[column])
+        row['seed'] = int(row['seed']) if row['seed'] else None
+    return rows
+
+
+def read_member(path, row):
+    """Read the bytes of one index ``row`` straight from the archive at ``path``."""
+    with open(path, 'rb') as f:
+        f.seek(row['offset'])
+        return f.read(row['size'])
+
+
+def open_array(path):
+    """Memory-map the frames of an ``.npy`` archive as a read-only ``(N, height, width, 3)`` array."""
+    import numpy as np
+
+    return np.load(path, mmap_mode='r')
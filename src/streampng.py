@@ -0,0 +1,168 @@
+"""Stream big circle canvases straight to PNG, one row at a time.
+
+A 8192x8192 RGB canvas is 192 MiB, and Pillow first fills all of it and then
+filters and deflates every row. The rows of a circle image are simple: the
+border, then white with at most one span of the circle color. ``write_png``
+builds every row from the circle geometry of ``rasterizer`` (so the pixels are
+identical to ``draw_image``) and filters it the PNG way:
+
+* a row equal to the previous one, which is every row above and below the
+  circle and most rows of its flat top and bottom, is "Up" filtered into a
+  constant row of zeros,
+* the other rows are "Sub" filtered, zeros except where the color changes.
+
+Long runs of constant rows are not deflated at all: a block of them is
+compressed once per row length and spliced into the stream as often as
+needed, after a full flush so that no back reference crosses it, and the
+Adler-32 checksum of the run is combined arithmetically. Only the rows
+crossing the circle are built and compressed, and the memory use is a few
+rows whatever the canvas size.
+"""
+import functools
+import struct
+import zlib
+
+import numpy as np
+
+from circlemaker import palette_of
+from encoders import PNG
+from rasterizer import circle_box, row_half_widths
+
+_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+_FILTER_SUB, _FILTER_UP = 1, 2
+_IDAT_SIZE = 1024 * 1024
+_BLOCK_SIZE = 256 * 1024  # the raw bytes of a spliced block of constant rows
+_DEFAULT_COMPRESS_LEVEL = 6  # Pillow's
+_ADLER_BASE = 65521
+
+
+def _chunk(kind, data):
+    return struct.pack('>I', len(data)) + kind + data + struct.pack('>I', zlib.crc32(kind + data))
+
+
+def _adler32_combine(adler1, adler2, length2):
+    """Return the Adler-32 of two concatenated strings from theirs, like zlib's ``adler32_combine``."""
+    remainder = length2 % _ADLER_BASE
+    sum1 = adler1 & 0xffff
+    sum2 = remainder * sum1 % _ADLER_BASE
+    sum1 = (sum1 + (adler2 & 0xffff) + _ADLER_BASE - 1) % _ADLER_BASE
+    sum2 = (sum2 + (adler1 >> 16) + (adler2 >> 16) + _ADLER_BASE - remainder) % _ADLER_BASE
+    return sum1 | sum2 << 16
+
+
+@functools.lru_cache(maxsize=16)
+def _up_block(row_size, level):
+    """Return the rows of an "Up" block, its raw deflate blocks ending on a full flush, its length and Adler-32."""
+    rows = max(1, _BLOCK_SIZE // row_size)
+    data = (bytes([_FILTER_UP]) + bytes(row_size - 1)) * rows
+    compressor = zlib.compressobj(level, zlib.DEFLATED, -zlib.MAX_WBITS)
+    return rows, compressor.compress(data) + compressor.flush(zlib.Z_FULL_FLUSH), len(data), zlib.adler32(data)
+
+
+def _sub_filtered(row, bpp):
+    filtered = row.copy()
+    filtered[bpp:] -= row[:-bpp]  # uint8 arithmetic wraps around like the PNG filter
+    return bytes([_FILTER_SUB]) + filtered.tobytes()
+
+
+def write_png(output, d, hue, border_hue, canvas_size, encoding=PNG):
+    """Write the PNG of a circle on a ``canvas_size`` canvas to a binary file object.
+
+    Args:
+        output (file): a binary file object.
+        d (float): the diameter of the circle.
+        hue (float): the hue of the circle.
+        border_hue (int): the hue of the border.
+        canvas_size (int): the canvas width and height.
+        encoding (Encoding, optional): a png encoding, its ``palette`` and ``compress_level`` are honored. Defaults to PNG.
+    """
+    colors = np.array(palette_of(hue, border_hue), dtype=np.uint8).reshape(3, 3)
+    if encoding.palette:
+        background, fill, border, bpp = [np.array([i], dtype=np.uint8) for i in range(3)] + [1]
+    else:
+        (background, fill, border), bpp = colors, 3
+
+    header = struct.pack('>IIBBBBB', canvas_size, canvas_size, 8, 3 if encoding.palette else 2, 0, 0, 0)
+    output.write(_SIGNATURE + _chunk(b'IHDR', header))
+    if encoding.palette:
+        output.write(_chunk(b'PLTE', colors.tobytes()))
+
+    level = _DEFAULT_COMPRESS_LEVEL if encoding.compress_level is None else encoding.compress_level
+    compressor = zlib.compressobj(level, zlib.DEFLATED, -zlib.MAX_WBITS)  # raw deflate, the zlib wrapper is ours
+    pending = [zlib.compress(b'', level)[:2]]
+    pending_size = 0
+    adler = zlib.adler32(b'')
+
+    def emit(compressed):
+        nonlocal pending_size
+        if compressed:
+            pending.append(compressed)
+            pending_size += len(compressed)
+            if pending_size >= _IDAT_SIZE:
+                flush()
+
+    def flush():
+        nonlocal pending_size
+        if pending:
+            output.write(_chunk(b'IDAT', b''.join(pending)))
+            pending.clear()
+            pending_size = 0
+
+    def feed(data):
+        nonlocal adler
+        adler = zlib.adler32(data, adler)
+        emit(compressor.compress(data))
+
+    def repeat_up_rows(count):
+        nonlocal adler
+        block_rows, block, block_size, block_adler = _up_block(len(up_row), level)
+        if count >= block_rows:
+            emit(compressor.flush(zlib.Z_FULL_FLUSH))  # the spliced blocks must not be referenced
+            for _ in range(count // block_rows):
+                emit(block)
+                adler = _adler32_combine(adler, block_adler, block_size)
+            count %= block_rows
+        feed(up_row * count)
+
+    up_row = bytes([_FILTER_UP]) + bytes(canvas_size * bpp)
+    background_row = np.tile(background, canvas_size)
+    background_row[:bpp] = border
+    background_row[-bpp:] = border
+
+    x0, a = circle_box(d, canvas_size)
+    widths = row_half_widths(a) if a > 0 else ()  # Pillow draws nothing for an empty box
+    center = 2 * x0 + a
+
+    def row_key(y):
+        if y in (0, canvas_size - 1):
+            return 'border'
+        if 0 <= y - x0 < len(widths):
+            w = int(widths[y - x0])
+            first, last = max(-(-(center - w) // 2), 1), min((center + w) // 2, canvas_size - 2)
+            if first <= last:
+                return first, last
+        return 'background'
+
+    y = 0
+    while y < canvas_size:
+        key = row_key(y)
+        run = 1
+        while y + run < canvas_size and row_key(y + run) == key:
+            run += 1
+
+        if key == 'border':
+            row = np.tile(border, canvas_size)
+        elif key == 'background':
+            row = background_row
+        else:
+            first, last = key
+            row = background_row.copy()
+            row[first * bpp:(last + 1) * bpp] = np.tile(fill, last - first + 1)
+        feed(_sub_filtered(row, bpp))
+        repeat_up_rows(run - 1)
+        y += run
+
+    emit(compressor.flush())
+    emit(struct.pack('>I', adler))
+    flush()
+    output.write(_chunk(b'IEND', b''))
@@ -0,0 +1,86 @@
+import os, io, tarfile, zipfile
+import pytest, numpy as np
+from PIL import Image
+from batch import read_manifest, run_batch
+from circlemaker import render_array, render_bytes
+from sinks import open_array, open_sink, read_index, read_member
+from utils.harness import run_circlemaker
+
+
+MANIFEST = "d,hue,path,seed\n" + "".join(f"{d},{d % 361},circles/{d}.png,{d}\n" for d in range(10, 400, 40)) + "400,10,bad.png,1\n"
+EXPECTED = list(range(10, 400, 40))
+NPY_OPTIONS_ERROR = "error: an .npy archive holds raw RGB frames, it cannot be combined with -format, -compress-level or -palette"
+
+
+@pytest.mark.smoke
+@pytest.mark.parametrize("extension,workers,pipeline", [(".tar", 1, False), (".zip", 2, False), (".tar", 2, True), (".zip", 1, True)])
+def test_encoded_archive(tmp_path, extension, workers, pipeline):
+    path = f"{tmp_path}/circles{extension}"
+    with open_sink(path) as sink:
+        rendered, failed = run_batch(read_manifest(io.StringIO(MANIFEST)), out=io.StringIO(), err=io.StringIO(),
+                                     workers=workers, pipeline=pipeline, sink=sink)
+
+    assert (rendered, failed) == (len(EXPECTED), 1)
+    assert not os.path.exists("circles")
+    index = read_index(path)
+    assert [row["name"] for row in index] == [f"circles/{d}.png" for d in EXPECTED]
+    for row in index:
+        d = int(row["d"])
+        assert (row["hue"], row["seed"]) == (d % 361, d)
+        assert read_member(path, row) == render_bytes(d, d % 361, seed=d)
+
+    if extension == ".tar":
+        with tarfile.open(path) as archive:
+            assert archive.extractfile("circles/10.png").read() == render_bytes(10, 10, seed=10)
+    else:
+        with zipfile.ZipFile(path) as archive:
+            assert archive.read("circles/10.png") == render_bytes(10, 10, seed=10)
+
+
+@pytest.mark.parametrize("pipeline", [False, True])
+def test_array_archive(tmp_path, pipeline):
+    path = f"{tmp_path}/circles.npy"
+    with open_sink(path) as sink:
+        run_batch(read_manifest(io.StringIO(MANIFEST)), out=io.StringIO(), err=io.StringIO(), pipeline=pipeline, sink=sink)
+
+    frames = open_array(path)
+    assert isinstance(frames, np.memmap) and frames.shape == (len(EXPECTED), 400, 400, 3)
+    for frame, row, d in zip(frames, read_index(path), EXPECTED):
+        assert np.array_equal(frame, render_array(d, d % 361, seed=d))
+        with open(path, "rb") as f:
+            f.seek(row["offset"])
+            assert f.read(row["size"]) == frame.tobytes()
+
+
+def test_archive_cli(tmp_path):
+    manifest = tmp_path / "jobs.csv"
+    manifest.write_text(MANIFEST)
+
+    out, err, returncode = run_circlemaker(["-batch", manifest, "-archive", f"{tmp_path}/out.tar", "-palette"])
+
+    assert returncode == 1
+    assert f"{len(EXPECTED)} rendered, 1 failed" in out
+    with tarfile.open(f"{tmp_path}/out.tar") as archive:
+        assert Image.open(archive.extractfile("circles/50.png")).mode == "P"
+
+
+@pytest.mark.parametrize(
+    "options,expected_result",
+    [
+        ("-archive out.rar", (2, "error: unknown archive format '.rar', must be one of .tar, .zip, .npy")),  # (options ,(error_code, message))
+        ("-archive out.tar -cache cache", (2, "error: -cache cannot be combined with -pipeline or -archive")),
+        ("-archive out.npy -format bmp", (2, NPY_OPTIONS_ERROR)),
+        ("-archive out.npy -compress-level 1", (2, NPY_OPTIONS_ERROR)),
+        ("-archive out.npy -palette", (2, NPY_OPTIONS_ERROR)),
+    ],
+)
+def test_archive_invalid_options(tmp_path, monkeypatch, options, expected_result):
+    manifest = tmp_path / "jobs.csv"
+    manifest.write_text(MANIFEST)
+
+    monkeypatch.chdir(tmp_path)
+
+    out, err, returncode = run_circlemaker(["-batch", manifest, *options.split()])
+
+    assert returncode == expected_result[0]
+    assert expected_result[1] in err
@@ -0,0 +1,120 @@
+import asyncio, time
+import pytest
+from asyncrender import AsyncRenderer
+from circlemaker import render_bytes
+from encoders import PNG, Encoding
+
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+
+@pytest.mark.smoke
+def test_render_bytes_matches_the_sync_api():
+    async def render():
+        async with AsyncRenderer(max_workers=2) as renderer:
+            return await renderer.render_bytes(40, 10, seed=3), await renderer.render_bytes(40, 10, 3, Encoding("bmp"))
+
+    png, bmp = run(render())
+
+    assert png == render_bytes(40, 10, 3)
+    assert bmp == render_bytes(40, 10, 3, Encoding("bmp"))
+
+
+def test_draw_image(tmp_path):
+    async def draw():
+        async with AsyncRenderer() as renderer:
+            await asyncio.gather(*[renderer.draw_image(d, 10, f"{tmp_path}/{d}.png", seed=d) for d in range(0, 400, 40)])
+
+    run(draw())
+
+    for d in range(0, 400, 40):
+        with open(f"{tmp_path}/{d}.png", "rb") as f:
+            assert f.read() == render_bytes(d, 10, d)
+
+
+def test_identical_requests_are_coalesced():
+    async def render():
+        async with AsyncRenderer(max_workers=1) as renderer:
+            results = await asyncio.gather(*[renderer.render_bytes(100, 200, seed=i % 2) for i in range(20)])
+            return results, renderer.renders, renderer.coalesced
+
+    results, renders, coalesced = run(render())
+
+    assert (renders, coalesced) == (2, 18)
+    assert set(results) == {render_bytes(100, 200, 0), render_bytes(100, 200, 1)}
+
+
+def test_cancelled_caller_does_not_cancel_the_shared_render():
+    async def render():
+        async with AsyncRenderer(max_workers=1) as renderer:
+            first = asyncio.ensure_future(renderer.render_bytes(300, 10, seed=1))
+            second = asyncio.ensure_future(renderer.render_bytes(300, 10, seed=1))
+            await asyncio.sleep(0)
+            first.cancel()
+            return await second
+
+    assert run(render()) == render_bytes(300, 10, 1)
+
+
+def test_errors_reach_every_caller(tmp_path):
+    async def draw():
+        async with AsyncRenderer() as renderer:
+            return await asyncio.gather(
+                renderer.draw_image(40, 10, f"{tmp_path}/missing/test.png"),
+                renderer.render_bytes(40, 10, encoding=Encoding("unknown")),
+                return_exceptions=True,
+            )
+
+    write_error, render_error = run(draw())
+
+    assert isinstance(write_error, FileNotFoundError)
+    assert isinstance(render_error, ValueError)
+
+
+@pytest.mark.parametrize(
+    "request_args,expected_error",
+    [
+        ((400, 10), "Argument must be within 0 <= arg <= 399"),  # ((d, hue, seed, encoding, canvas_size), error)
+        ((10, 361), "Argument must be within 0 <= arg <= 360"),
+        ((10, "red"), "Argument must be a float type number"),
+        ((10, 10, -1), "Argument must be >= 0"),
+        ((10, 10, None, Encoding("jpeg")), "unknown format 'jpeg'"),
+        ((10, 10, None, Encoding("bmp", 1)), "a compress level can only be used with the png format"),
+        ((10, 10, None, PNG, 9000), "Argument must be within 3 <= arg <= 8192"),
+        ((1000, 10, None, PNG, 1000), "Argument must be within 0 <= arg <= 999"),
+    ],
+)
+def test_invalid_requests_are_not_queued(request_args, expected_error):
+    async def render():
+        async with AsyncRenderer() as renderer:
+            with pytest.raises(ValueError, match=expected_error):
+                await renderer.render_bytes(*request_args)
+            return renderer.renders
+
+    assert run(render()) == 0
+
+
+def test_event_loop_stays_responsive(tmp_path):
+    async def draw():
+        gaps, done = [], False
+
+        async def ticker():
+            last = time.perf_counter()
+            while not done:
+                await asyncio.sleep(0.001)
+                now = time.perf_counter()
+                gaps.append(now - last)
+                last = now
+
+        async with AsyncRenderer(max_pending=4) as renderer:
+            ticks = asyncio.ensure_future(ticker())
+            await asyncio.gather(*[renderer.draw_image(d, d % 361, f"{tmp_path}/{d % 20}-{d}.png", seed=d) for d in range(300)])
+            done = True
+            await ticks
+        return gaps
+
+    gaps = run(draw())
+
+    assert len(gaps) > 10
+    assert max(gaps) < 0.25
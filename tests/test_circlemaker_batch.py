@@ -0,0 +1,92 @@
+import os, io
+import pytest, cv2 as cv
+from batch import read_manifest, run_batch
+from utils.circledetector import CircleDetector
+from utils.harness import run_circlemaker, value_within_range
+
+
+@pytest.mark.smoke
+def test_batch_csv_manifest(tmp_path):
+    jobs = [(40, 0, 20), (151, 120, 75.5), (399, 150, 199)]
+    manifest = tmp_path / "jobs.csv"
+    manifest.write_text("d,hue,path\n" + "".join(f"{d},{hue},{tmp_path}/{i}.png\n" for i, (d, hue, _) in enumerate(jobs)))
+
+    out, err, returncode = run_circlemaker(["-batch", manifest])
+
+    assert returncode == 0
+    assert "3 rendered, 0 failed" in out
+    for i, (_, hue, expected_r) in enumerate(jobs):
+        circle = CircleDetector(img_path=cv.imread(f"{tmp_path}/{i}.png"), circle_hue=hue)
+        assert value_within_range(circle.get_circle_radius(), expected_r, 1)
+
+
+@pytest.mark.smoke
+def test_batch_jsonl_from_stdin(tmp_path):
+    manifest = f'{{"d": 40, "hue": 60, "path": "{tmp_path}/a.png"}}\n{{"d": 80, "hue": 200, "path": "{tmp_path}/b.png"}}\n'
+
+    out, err, returncode = run_circlemaker(["-batch", "-"], stdin=manifest)
+
+    assert returncode == 0
+    assert "2 rendered, 0 failed" in out
+    assert os.path.exists(f"{tmp_path}/a.png") and os.path.exists(f"{tmp_path}/b.png")
+
+
+@pytest.mark.parametrize(
+    "row,expected_error",
+    [
+        ("400,10", "error: line 3: field d: Argument must be within 0 <= arg <= 399"),  # (d,hue ,expected error)
+        ("10,361", "error: line 3: field hue: Argument must be within 0 <= arg <= 360"),
+        ("ten,10", "error: line 3: field d: Argument must be a float type number"),
+        (",10", "error: line 3: missing field 'd'"),
+    ],
+)
+def test_batch_reports_failures_without_aborting(tmp_path, row, expected_error):
+    manifest = io.StringIO(f"d,hue,path\n40,10,{tmp_path}/first.png\n{row},{tmp_path}/bad.png\n40,10,{tmp_path}/last.png\n")
+    out, err = io.StringIO(), io.StringIO()
+
+    rendered, failed = run_batch(read_manifest(manifest), out=out, err=err)
+
+    assert (rendered, failed) == (2, 1)
+    assert expected_error in err.getvalue()
+    assert os.path.exists(f"{tmp_path}/first.png") and os.path.exists(f"{tmp_path}/last.png")
+    assert not os.path.exists(f"{tmp_path}/bad.png")
+
+
+def test_batch_exit_code_on_failure(tmp_path):
+    manifest = f"d,hue,path\n40,10,{tmp_path}/missing_dir/a.png\n"
+
+    out, err, returncode = run_circlemaker(["-batch", "-"], stdin=manifest)
+
+    assert returncode == 1
+    assert "0 rendered, 1 failed" in out
+
+
+def test_batch_missing_manifest(tmp_path):
+    out, err, returncode = run_circlemaker(["-batch", f"{tmp_path}/missing.csv", "-archive", f"{tmp_path}/circles.tar"])
+
+    assert returncode == 2
+    assert err.startswith("error: ") and "missing.csv" in err
+    assert os.listdir(tmp_path) == []
+
+
+@pytest.mark.parametrize("workers,chunksize", [(2, 1), (3, 4)])
+def test_batch_workers_preserve_order(tmp_path, workers, chunksize):
+    rows = "".join(f"{d},{d % 361},{tmp_path}/{d}.png\n" for d in range(10, 30))
+    manifest = io.StringIO(f"d,hue,path\n{rows}500,10,{tmp_path}/bad.png\n")
+    out, err = io.StringIO(), io.StringIO()
+
+    rendered, failed = run_batch(read_manifest(manifest), out=out, err=err, workers=workers, chunksize=chunksize)
+
+    assert (rendered, failed) == (20, 1)
+    assert out.getvalue().splitlines()[:-1] == [f"ok {tmp_path}/{d}.png" for d in range(10, 30)]
+    assert "error: line 22: field d" in err.getvalue()
+
+
+def test_batch_workers_cli(tmp_path):
+    manifest = "d,hue,path\n" + "".join(f"{d},{d},{tmp_path}/{d}.png\n" for d in range(5, 15))
+
+    out, err, returncode = run_circlemaker(["-batch", "-", "-workers", 2, "-chunksize", 3], stdin=manifest)
+
+    assert returncode == 0
+    assert "10 rendered, 0 failed" in out
+    assert sorted(os.listdir(tmp_path)) == sorted(f"{d}.png" for d in range(5, 15))
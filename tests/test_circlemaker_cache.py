@@ -0,0 +1,104 @@
+import os, io
+import pytest
+from batch import read_manifest, run_batch
+from cache import RenderCache
+from circlemaker import draw_image
+from utils.harness import read_bytes
+
+
+@pytest.mark.smoke
+def test_cache_hits_are_identical_to_renders(tmp_path):
+    cache = RenderCache(f"{tmp_path}/cache")
+    manifest = "d,hue,path,seed\n" + "".join(f"{d},{d},{tmp_path}/{run}_{d}.png,{d}\n" for run in ("a", "b") for d in (10, 20, 30))
+
+    out = io.StringIO()
+    rendered, failed = run_batch(read_manifest(io.StringIO(manifest)), out=out, cache=cache)
+
+    assert (rendered, failed) == (6, 0)
+    assert (cache.hits, cache.misses, len(cache)) == (3, 3, 3)
+    assert "cache: 3 hits, 3 misses" in out.getvalue()
+    for d in (10, 20, 30):
+        expected = io.BytesIO()
+        draw_image(d, d, expected, d)
+        assert read_bytes(f"{tmp_path}/a_{d}.png") == expected.getvalue()
+        assert read_bytes(f"{tmp_path}/b_{d}.png") == expected.getvalue()
+
+
+def test_cache_persists_between_runs(tmp_path):
+    RenderCache(f"{tmp_path}/cache").store(RenderCache.key(d=40, hue=10, border_hue=5), b"cached")
+
+    cache = RenderCache(f"{tmp_path}/cache")
+    assert cache.restore(RenderCache.key(d=40.0, hue=10.0, border_hue=5), f"{tmp_path}/out.png")
+    assert not cache.restore(RenderCache.key(d=41, hue=10, border_hue=5), f"{tmp_path}/miss.png")
+    assert read_bytes(f"{tmp_path}/out.png") == b"cached"
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_cache_evicts_least_recently_used(tmp_path):
+    cache = RenderCache(f"{tmp_path}/cache", max_bytes=30)
+    for name in ("a", "b", "c"):
+        cache.store(name, name.encode() * 10)
+    assert cache.restore("a", f"{tmp_path}/a.png")  # "b" is now the least recently used
+
+    cache.store("d", b"d" * 10)
+
+    assert "b" not in cache and all(key in cache for key in ("a", "c", "d"))
+    assert cache.evictions == 1
+    assert cache.stats()["bytes"] == 30
+    assert sorted(os.listdir(f"{tmp_path}/cache")) == ["a.img", "c.img", "d.img"]
+
+
+def test_cache_link(tmp_path):
+    cache = RenderCache(f"{tmp_path}/cache", link=True)
+    cache.store("a", b"data")
+
+    assert cache.restore("a", f"{tmp_path}/out.png")
+    assert read_bytes(f"{tmp_path}/out.png") == b"data"
+    assert os.path.samefile(f"{tmp_path}/out.png", f"{tmp_path}/cache/a.img")
+
+
+def test_cache_with_workers(tmp_path):
+    cache = RenderCache(f"{tmp_path}/cache")
+    manifest = "d,hue,path,seed\n" + "".join(f"{d},{d},{tmp_path}/{i}.png,1\n" for i, d in enumerate([10, 20] * 8))
+
+    out = io.StringIO()
+    rendered, failed = run_batch(read_manifest(io.StringIO(manifest)), out=out, workers=2, chunksize=4, cache=cache)
+
+    assert (rendered, failed) == (16, 0)
+    assert len(RenderCache(f"{tmp_path}/cache")) == 2
+    assert read_bytes(f"{tmp_path}/0.png") == read_bytes(f"{tmp_path}/14.png")
+
+
+def test_cache_link_outputs_are_not_overwritten(tmp_path):
+    cache = RenderCache(f"{tmp_path}/cache", link=True)
+    jobs = [(200, "first"), (200, "shared"), (40, "shared"), (200, "last")]  # the d=40 miss writes over a linked hit
+    manifest = "d,hue,path,seed\n" + "".join(f"{d},10,{tmp_path}/{name}.png,1\n" for d, name in jobs)
+
+    run_batch(read_manifest(io.StringIO(manifest)), out=io.StringIO(), cache=cache)
+
+    for d, name in ((40, "shared"), (200, "first"), (200, "last")):
+        expected = io.BytesIO()
+        draw_image(d, 10, expected, 1)
+        assert read_bytes(f"{tmp_path}/{name}.png") == expected.getvalue()
+
+
+def test_draw_image_over_a_cache_link(tmp_path):
+    cache = RenderCache(f"{tmp_path}/cache", link=True)
+    cache.store("a", b"data")
+    assert cache.restore("a", f"{tmp_path}/out.png")
+
+    draw_image(40, 10, f"{tmp_path}/out.png", 1)
+
+    assert read_bytes(f"{tmp_path}/cache/a.img") == b"data"
+    assert not os.path.samefile(f"{tmp_path}/out.png", f"{tmp_path}/cache/a.img")
+
+
+def test_cache_shared_between_processes(tmp_path):
+    first, second = (RenderCache(f"{tmp_path}/cache", max_bytes=80, processes=2) for _ in range(2))
+    first.store("a", b"a" * 10)
+
+    assert second.restore("a", f"{tmp_path}/a.png")  # stored by another process
+    for i in range(40):
+        (first, second)[i % 2].store(f"key{i}", b"x" * 10)
+        on_disk = sum(entry.stat().st_size for entry in os.scandir(f"{tmp_path}/cache"))
+        assert on_disk <= 80 + 80 // 8
@@ -0,0 +1,36 @@
+import io, random
+import pytest
+from PIL import Image
+from circlemaker import draw_image
+from canvas import CanvasRenderer
+
+
+def render_both(renderer, d, hue, seed):
+    expected, actual = io.BytesIO(), io.BytesIO()
+    random.seed(seed)
+    draw_image(d, hue, expected)
+    random.seed(seed)
+    renderer.draw_image(d, hue, actual)
+    return Image.open(expected), Image.open(actual)
+
+
+@pytest.mark.smoke
+def test_reused_canvas_is_pixel_identical():
+    renderer = CanvasRenderer()
+    # big circles followed by small ones make sure the previous circle is fully erased
+    diameters = [399, 0, 398.7, 3, 151.5, 1, 200, 7.3, 395, 0.4, 399, 2, 50.5]
+    hues = [0, 360, 200, 150, 1, 359, 89, 60, 15, 300, 120, 45, 250]
+
+    for seed, (d, hue) in enumerate(zip(diameters, hues)):
+        expected, actual = render_both(renderer, d, hue, seed)
+        assert actual.tobytes() == expected.tobytes()
+
+
+def test_reused_canvas_random_sequence():
+    renderer = CanvasRenderer()
+    rng = random.Random(2022)
+
+    for seed in range(100):
+        d, hue = rng.uniform(0, 399), rng.randint(0, 360)
+        expected, actual = render_both(renderer, d, hue, seed)
+        assert actual.tobytes() == expected.tobytes()
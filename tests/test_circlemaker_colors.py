@@ -0,0 +1,57 @@
+import pytest, cv2 as cv, numpy as np
+from PIL import ImageColor
+from circlemaker import render_array
+from colors import cv_hue, hue_bgr, hue_rgb, hue_rgb_array, rgb_hsv
+from utils.circledetector import BatchCircleDetector, CircleDetector
+
+HUES = [0, 0.5, 1, 59.9, 60, 89, 120.25, 180, 239.999, 300, 333.3, 359, 359.5, 359.9, 360]
+
+
+@pytest.mark.smoke
+@pytest.mark.parametrize("hue", HUES)
+def test_hue_rgb_matches_pillow(hue):
+    assert hue_rgb(hue) == ImageColor.getrgb(f"hsv({hue}, 100%, 100%)")
+    assert hue_bgr(hue) == hue_rgb(hue)[::-1]
+
+
+@pytest.mark.parametrize("hue", HUES)
+def test_rgb_hsv_inverts_hue_rgb(hue):
+    h, s, v = rgb_hsv(hue_rgb(hue))
+
+    assert min(abs(h - hue), 360 - abs(h - hue)) <= 0.25
+    assert (s, v) == (100, 100)
+
+
+def test_hue_rgb_array_matches_hue_rgb():
+    hues = np.concatenate([np.arange(361), np.linspace(0, 360, 10007)])
+
+    colors = hue_rgb_array(hues)
+
+    assert colors.dtype == np.uint8 and colors.shape == (len(hues), 3)
+    assert [tuple(rgb) for rgb in colors.tolist()] == [hue_rgb(hue) for hue in hues.tolist()]
+
+
+def test_cv_hue_matches_opencv():
+    hues = np.linspace(0, 360, 4001)
+    rgb = hue_rgb_array(hues).reshape(1, -1, 3)
+
+    expected = cv.cvtColor(rgb, cv.COLOR_RGB2HSV_FULL)[0, :, 0]
+
+    assert [cv_hue(hue) for hue in hues.tolist()] == expected.tolist()
+
+
+@pytest.mark.parametrize("hue", [0, 359.9, 360])
+def test_pure_red_is_hue_0(hue):
+    assert hue_rgb(hue) == (255, 0, 0)
+    assert cv_hue(hue) == 0
+
+
+@pytest.mark.parametrize("hue", [0.4, 358.6, 359.5, 359.7])
+def test_detect_circles_near_360(hue):
+    img = render_array(100, hue, seed=1, channels="BGR")
+
+    detector = CircleDetector(img, hue)
+    [(radius, rgb)] = BatchCircleDetector().detect_all([img], [hue])
+
+    assert detector.get_circle_radius() == radius == pytest.approx(50, abs=1)
+    assert detector.get_circle_rgb_color() == rgb == hue_rgb(hue)
@@ -0,0 +1,127 @@
+import pytest, numpy as np
+from circlemaker import render_array
+from rasterizer import render_stack
+from utils.circledetector import BatchCircleDetector, CircleDetector, load_canvases, scanline_run_lengths
+
+
+def single_detection(img, hue):
+    detector = CircleDetector(img, hue)
+    return detector.get_circle_radius(), detector.get_circle_rgb_color()
+
+
+@pytest.mark.smoke
+@pytest.mark.parametrize("hue", [0, 1, 89, 180, 359.5, 360])
+def test_batch_matches_single_detector(hue):
+    ds = [0, 2, 3, 5, 50, 89, 200, 398, 399]
+    imgs = [render_array(d, hue, channels="BGR") for d in ds]
+
+    results = BatchCircleDetector().detect_all(imgs, [hue] * len(ds))
+
+    for img, (radius, rgb) in zip(imgs, results):
+        expected_radius, expected_rgb = single_detection(img, hue)
+        assert radius == expected_radius
+        assert rgb == expected_rgb or (rgb is None and expected_radius is None)
+
+
+def test_batch_of_a_stack_array():
+    hues = [10, 120, 240, 300]
+    stack = render_stack([100, 150, 200, 250], hues, seeds=range(4))[..., ::-1]  # BGR like cv2
+
+    results = BatchCircleDetector().detect_all(stack, hues)
+
+    for img, hue, (radius, rgb) in zip(stack, hues, results):
+        assert (radius, rgb) == single_detection(np.ascontiguousarray(img), hue)
+
+
+def test_batch_needs_a_hue_per_image():
+    with pytest.raises(ValueError):
+        BatchCircleDetector().detect_all([render_array(50, 10, channels="BGR")], [10, 20])
+
+
+def test_scanline_run_lengths():
+    lines = np.array(
+        [
+            [0, 1, 1, 1, 0, 0],
+            [1, 1, 1, 1, 1, 1],
+            [1, 1, 0, 1, 1, 1],
+            [0, 0, 0, 1, 1, 0],
+        ],
+        dtype=bool,
+    )
+    assert scanline_run_lengths(lines, 3).tolist() == [3, 6, 3, 2]
+
+
+@pytest.mark.parametrize("d", [3, 4, 7, 8, 40, 75.5, 151, 200.25, 395, 396])
+def test_scanline_radius(d):
+    detector = CircleDetector(render_array(d, 120, channels="BGR"), 120, method="scanline")
+
+    assert abs(detector.get_circle_radius() - d / 2) <= 0.5
+    assert detector.get_circle_rgb_color() == (0, 255, 0)
+
+
+@pytest.mark.parametrize("d", [0, 2])
+def test_scanline_too_small_circle(d):
+    assert CircleDetector(render_array(d, 120, channels="BGR"), 120, method="scanline").get_circle_radius() is None
+
+
+def test_unknown_method():
+    with pytest.raises(ValueError, match="unknown method"):
+        CircleDetector(render_array(50, 120, channels="BGR"), 120, method="naive")
+
+
+@pytest.mark.parametrize("method", ["contour", "hough", "scanline", "auto"])
+def test_every_method_is_reachable(method):
+    detector = CircleDetector(render_array(200, 240, channels="BGR"), 240, method=method)
+
+    assert abs(detector.get_circle_radius() - 100) <= 5
+    assert detector.get_detection_method() == ("scanline" if method == "auto" else method)
+    assert list(detector.get_timings()) == [detector.get_detection_method()]
+
+
+def test_auto_escalates_on_a_tiny_circle():
+    detector = CircleDetector(render_array(3, 240, channels="BGR"), 240, method="auto")
+
+    assert detector.get_circle_radius() == pytest.approx(1.5, abs=1)
+    assert detector.get_detection_method() == "contour"
+    assert list(detector.get_timings()) == ["scanline", "contour"]
+
+
+def test_auto_without_a_circle():
+    detector = CircleDetector(render_array(0, 240, channels="BGR"), 240, method="auto")
+
+    assert detector.get_circle_radius() is None
+    assert set(detector.get_timings()) == {"scanline", "contour", "hough"}
+    assert all(seconds >= 0 for seconds in detector.get_timings().values())
+
+
+@pytest.mark.parametrize("name", ["canvases.rgb", "canvases.npy"])
+def test_memory_mapped_canvases(tmp_path, name):
+    ds, hues = [40, 151, 0, 300], [0, 120, 200, 359]
+    stack = render_stack(ds, hues, seeds=range(4))
+    path = f"{tmp_path}/{name}"
+    if name.endswith(".npy"):
+        np.save(path, stack)
+    else:
+        stack.tofile(path)
+
+    canvases = load_canvases(path)
+
+    assert isinstance(canvases, np.memmap) and not canvases.flags.writeable
+    assert canvases.shape == (4, 400, 400, 3)
+    results = BatchCircleDetector(channels="RGB").detect_all(canvases, hues)
+    for img, hue, (radius, rgb) in zip(stack, hues, results):
+        assert (radius, rgb) == single_detection(np.ascontiguousarray(img[..., ::-1]), hue)
+    for method in ("contour", "hough", "scanline", "auto"):
+        detector = CircleDetector(canvases[1], 120, method=method, channels="RGB")
+        assert abs(detector.get_circle_radius() - 75.5) <= 5
+        assert detector.get_circle_rgb_color() == (0, 255, 0)
+
+
+def test_bad_canvases_file(tmp_path):
+    with open(f"{tmp_path}/canvases.rgb", "wb") as f:
+        f.write(bytes(1000))
+    with pytest.raises(ValueError, match="not a multiple"):
+        load_canvases(f"{tmp_path}/canvases.rgb")
+
+    open(f"{tmp_path}/empty.rgb", "wb").close()
+    assert load_canvases(f"{tmp_path}/empty.rgb").shape == (0, 400, 400, 3)
@@ -0,0 +1,84 @@
+import io
+import pytest, numpy as np
+from PIL import Image
+from batch import read_manifest, run_batch
+from canvas import CanvasRenderer
+from circlemaker import draw_image
+from encoders import Encoding, save_image
+from utils.harness import run_circlemaker
+
+
+def load_rgb(output, encoding):
+    output.seek(0)
+    if encoding.format == "npy":
+        return np.load(output)
+    return np.asarray(Image.open(output).convert("RGB"))
+
+
+@pytest.mark.smoke
+@pytest.mark.parametrize(
+    "encoding",
+    [
+        Encoding("png", 0),
+        Encoding("png", 9),
+        Encoding("png", palette=True),
+        Encoding("bmp"),
+        Encoding("bmp", palette=True),
+        Encoding("ppm"),
+        Encoding("npy"),
+    ],
+)
+def test_formats_keep_pixels(encoding):
+    expected, actual = io.BytesIO(), io.BytesIO()
+    draw_image(151, 200, expected, seed=1)
+    draw_image(151, 200, actual, seed=1, encoding=encoding)
+
+    assert np.array_equal(load_rgb(actual, encoding), load_rgb(expected, Encoding()))
+
+
+@pytest.mark.parametrize("d,hue,border_hue", [(399, 0, 0), (151.5, 360, 120), (3, 200, 200), (0, 10, 300)])
+def test_palette_canvas_is_pixel_identical(d, hue, border_hue):
+    rgb, palette = CanvasRenderer(), CanvasRenderer(palette=True)
+    for previous_d in (395, d):  # the second render also checks the palette canvas cleanup
+        rgb.render(previous_d, hue, border_hue)
+        palette.render(previous_d, hue, border_hue)
+
+    assert palette.render(d, hue, border_hue).mode == "P"
+    assert palette.render(d, hue, border_hue).convert("RGB").tobytes() == rgb.render(d, hue, border_hue).tobytes()
+
+
+def test_batch_palette_png(tmp_path):
+    manifest = io.StringIO(f"d,hue,path,seed\n40,100,{tmp_path}/a.png,3\n")
+    run_batch(read_manifest(manifest), out=io.StringIO(), encoding=Encoding("png", 1, True))
+
+    expected = io.BytesIO()
+    draw_image(40, 100, expected, seed=3)
+    with Image.open(f"{tmp_path}/a.png") as image:
+        assert image.mode == "P"
+        assert image.convert("RGB").tobytes() == Image.open(expected).tobytes()
+
+
+def test_save_npy_to_path(tmp_path):
+    save_image(CanvasRenderer().render(40, 100, 3), f"{tmp_path}/a.raw", Encoding("npy"))
+
+    array = np.load(f"{tmp_path}/a.raw")
+    assert array.shape == (400, 400, 3) and array.dtype == np.uint8
+
+
+@pytest.mark.parametrize(
+    "options,expected_result",
+    [
+        ("-format ppm -palette", (2, "error: a palette can only be used with the png and bmp formats")),  # (options ,(error_code, message))
+        ("-format bmp -compress-level 1", (2, "error: a compress level can only be used with the png format")),
+        ("-compress-level 10", (2, "error: the compress level must be within 0 <= level <= 9")),
+        ("-format jpeg", (2, "error: argument -format: invalid choice: 'jpeg'")),
+        ("-format rgb", (2, "error: argument -format: invalid choice: 'rgb'")),
+        ("-format ppm", (0, "")),
+        ("-compress-level 0 -palette", (0, "")),
+    ],
+)
+def test_format_options(tmp_path, options, expected_result):
+    out, err, returncode = run_circlemaker(["-d", 40, "-hue", 10, *options.split(), "-path", f"{tmp_path}/test.img"])
+
+    assert returncode == expected_result[0]
+    assert expected_result[1] in err
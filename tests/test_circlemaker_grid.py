@@ -0,0 +1,27 @@
+import pytest
+from circlemaker import D_RANGE, HUE_RANGE, render_array
+from utils.circleverifier import count_mismatched_pixels
+from utils.harness import grid_values, run_circlemaker
+
+# a coarse grid by default, every integer (d, hue) pair with CIRCLEMAKER_FULL_GRID=1
+D_VALUES = grid_values(*D_RANGE, 7)
+HUE_VALUES = grid_values(*HUE_RANGE, 13)
+
+
+@pytest.mark.parametrize("d", D_VALUES)
+def test_grid_in_memory(d):
+    for hue in HUE_VALUES:
+        assert count_mismatched_pixels(render_array(d, hue), d, hue) == 0, f"d={d} hue={hue}"
+
+
+@pytest.mark.parametrize("d", D_VALUES[::8])
+def test_grid_through_the_command_line(d, tmp_path):
+    import numpy as np
+    from PIL import Image
+
+    hue = (d * 7) % 361
+    out, err, returncode = run_circlemaker(["-d", d, "-hue", hue, "-path", tmp_path / "test.png"])
+
+    assert (out, err, returncode) == ("", "", 0)
+    with Image.open(tmp_path / "test.png") as image:
+        assert count_mismatched_pixels(np.asarray(image), d, hue) == 0
@@ -0,0 +1,132 @@
+import io, json, os
+import pytest
+from batch import read_manifest, run_batch
+from incremental import BuildIndex
+from utils.harness import run_circlemaker
+
+
+def write_manifest(tmp_path, jobs):
+    lines = [json.dumps({**job, "path": f"{tmp_path}/{job['path']}"}) for job in jobs]
+    with open(f"{tmp_path}/jobs.jsonl", "w") as f:
+        f.write("\n".join(lines) + "\n")
+    return f"{tmp_path}/jobs.jsonl"
+
+
+def build(tmp_path, jobs, force=False, **options):
+    index = BuildIndex(f"{tmp_path}/index.json")
+    out = io.StringIO()
+    with open(write_manifest(tmp_path, jobs)) as manifest:
+        rendered, failed = run_batch(read_manifest(manifest), out=out, err=io.StringIO(), index=index, force=force, **options)
+    index.save()
+    return rendered, failed, out.getvalue()
+
+
+JOBS = [
+    {"d": 40, "hue": 10, "path": "a.png", "seed": 1},
+    {"d": 80, "hue": 20, "path": "b.png", "seed": 2},
+    {"d": 120, "hue": 30, "path": "c.png"},
+]
+
+
+@pytest.mark.smoke
+@pytest.mark.parametrize("options", [{}, {"workers": 2}, {"pipeline": True}])
+def test_unchanged_jobs_are_skipped(tmp_path, options):
+    assert build(tmp_path, JOBS, **options)[:2] == (3, 0)
+
+    rendered, failed, out = build(tmp_path, JOBS, **options)
+
+    assert (rendered, failed) == (0, 0)
+    assert "incremental: 3 unchanged" in out
+
+
+def test_changed_jobs_are_rendered(tmp_path):
+    build(tmp_path, JOBS)
+    jobs = [{**JOBS[0], "hue": 11}, JOBS[1], {**JOBS[2], "seed": 5}, {"d": 10, "hue": 10, "path": "d.png"}]
+
+    rendered, _, out = build(tmp_path, jobs)
+
+    assert rendered == 3
+    assert "a.png" in out and "b.png" not in out and "c.png" in out and "d.png" in out
+
+
+def test_modified_or_missing_outputs_are_rendered(tmp_path):
+    build(tmp_path, JOBS)
+    with open(f"{tmp_path}/a.png", "r+b") as f:
+        data = f.read()
+        f.seek(0)
+        f.write(bytes(reversed(data)))  # same size, other bytes
+    os.remove(f"{tmp_path}/b.png")
+
+    rendered, _, out = build(tmp_path, JOBS)
+
+    assert rendered == 2 and "c.png" not in out
+
+
+def test_touched_outputs_are_still_unchanged(tmp_path):
+    build(tmp_path, JOBS)
+    os.utime(f"{tmp_path}/a.png", ns=(0, 0))
+
+    assert build(tmp_path, JOBS)[0] == 0
+
+
+def test_force(tmp_path):
+    build(tmp_path, JOBS)
+
+    rendered, _, out = build(tmp_path, JOBS, force=True)
+
+    assert rendered == 3
+    assert "incremental: 0 unchanged" in out
+
+
+def test_encoding_change_is_rendered(tmp_path):
+    from encoders import Encoding
+
+    build(tmp_path, JOBS)
+
+    assert build(tmp_path, JOBS, encoding=Encoding("png", 1))[0] == 3
+
+
+def test_failed_jobs_are_forgotten(tmp_path):
+    build(tmp_path, JOBS)
+    os.remove(f"{tmp_path}/a.png")
+    os.mkdir(f"{tmp_path}/a.png")  # the output can't be written anymore
+
+    rendered, failed, _ = build(tmp_path, JOBS)
+
+    assert (rendered, failed) == (0, 1)
+    assert len(BuildIndex(f"{tmp_path}/index.json")) == 2
+
+
+def test_bad_index(tmp_path):
+    with open(f"{tmp_path}/index.json", "w") as f:
+        f.write("not json")
+    with pytest.raises(ValueError, match="is not a build index"):
+        BuildIndex(f"{tmp_path}/index.json")
+    with pytest.raises(ValueError, match="does not exist"):
+        BuildIndex(f"{tmp_path}/missing/index.json")
+
+
+def test_command_line(tmp_path):
+    manifest = write_manifest(tmp_path, JOBS)
+    incremental = ["-batch", manifest, "-incremental", f"{tmp_path}/index.json"]
+
+    assert run_circlemaker(incremental)[2] == 0
+    out, err, returncode = run_circlemaker(incremental)
+    assert returncode == 0 and "0 rendered, 0 failed" in out and "incremental: 3 unchanged" in out
+
+    out, err, returncode = run_circlemaker(incremental + ["-force"])
+    assert returncode == 0 and "3 rendered, 0 failed" in out
+
+
+@pytest.mark.parametrize(
+    "options,expected_result",
+    [
+        (["-force"], (2, "error: -force can only be used with -incremental")),  # (options ,(error_code, message))
+        (["-incremental", "index.json", "-archive", "out.tar"], (2, "error: -incremental cannot be combined with -archive")),
+    ],
+)
+def test_bad_options(tmp_path, options, expected_result):
+    out, err, returncode = run_circlemaker(["-batch", write_manifest(tmp_path, JOBS)] + options)
+
+    assert returncode == expected_result[0]
+    assert expected_result[1] in err
@@ -0,0 +1,46 @@
+import io
+import pytest, numpy as np
+from PIL import Image
+from circlemaker import draw_image, render_array, render_bytes, render_image
+from encoders import Encoding
+from utils.circledetector import CircleDetector
+from utils.harness import value_within_range
+
+
+@pytest.mark.smoke
+@pytest.mark.parametrize("encoding", [Encoding(), Encoding("png", 1, True), Encoding("bmp")])
+def test_render_bytes_matches_draw_image(encoding):
+    expected = io.BytesIO()
+    draw_image(151, 200, expected, seed=5, encoding=encoding)
+
+    assert render_bytes(151, 200, seed=5, encoding=encoding) == expected.getvalue()
+
+
+def test_render_image_and_array_agree():
+    image = render_image(151, 200, seed=5)
+    rgb = render_array(151, 200, seed=5)
+    bgr = render_array(151, 200, seed=5, channels="BGR")
+
+    assert isinstance(image, Image.Image)
+    assert rgb.shape == (400, 400, 3) and rgb.dtype == np.uint8
+    assert np.array_equal(rgb, np.asarray(image))
+    assert np.array_equal(bgr, rgb[..., ::-1])
+
+
+@pytest.mark.parametrize(
+    "d,hue,expected_r",
+    [
+        (40, 0, 20),  # (d,hue ,r)
+        (151, 360, 75.5),
+        (399, 150, 199),
+    ],
+)
+def test_render_array_into_detector(d, hue, expected_r):
+    circle = CircleDetector(img_path=render_array(d, hue, channels="BGR"), circle_hue=hue)
+
+    assert value_within_range(circle.get_circle_radius(), expected_r, 1)
+
+
+def test_render_array_invalid_channels():
+    with pytest.raises(ValueError):
+        render_array(40, 10, channels="HSV")
@@ -0,0 +1,125 @@
+import io
+import pytest
+import instrument
+from circlemaker import draw_image, float_in_range, render_array
+from utils.circledetector import CircleDetector
+from utils.harness import run_circlemaker
+
+
+@pytest.fixture
+def timers():
+    instrument.enable()
+    yield
+    instrument.reset()
+
+
+def test_disabled_records_nothing(tmp_path):
+    draw_image(40, 10, f"{tmp_path}/test.png")
+    instrument.count("nothing")
+
+    assert not instrument.enabled()
+    assert instrument.stats() == ({}, {})
+
+
+def test_stages_are_timed(tmp_path, timers):
+    for d in range(10):
+        draw_image(d, 10, f"{tmp_path}/{d}.png")
+    float_in_range(0, 10)(5)
+    CircleDetector(render_array(40, 10, channels="BGR"), 10, method="auto").get_circle_radius()
+    instrument.count("circles", 10)
+
+    summary, counters = instrument.stats()
+
+    for stage in ("render", "render.allocate", "encode", "write", "float_in_range", "detect.hsv", "detect.mask", "detect.scanline"):
+        assert stage in summary
+    assert summary["write"]["count"] == 10
+    assert summary["render"]["p50"] <= summary["render"]["p95"] <= summary["render"]["p99"] <= summary["render"]["max"]
+    assert counters == {"circles": 10}
+
+
+def test_contour_substages(timers):
+    CircleDetector(render_array(40, 10, channels="BGR"), 10, method="contour").get_circle_radius()
+
+    summary, _ = instrument.stats()
+
+    assert summary["detect.find_contours"]["count"] == summary["detect.enclose"]["count"] == 1
+    assert summary["detect.find_contours"]["total"] + summary["detect.enclose"]["total"] <= summary["detect.contour"]["total"]
+
+
+@pytest.mark.parametrize("session", [False, True])
+def test_isolated_keeps_the_running_session(profiled, session):
+    if session:
+        instrument.enable()
+        instrument.record("session", 0.001)
+        instrument.count("jobs")
+    before = instrument.stats()
+
+    with instrument.isolated():
+        instrument.record("case", 0.002)
+        assert instrument.enabled()
+        assert list(instrument.stats()[0]) == ["case"]
+
+    assert instrument.enabled() == session
+    assert instrument.stats() == before
+
+
+def test_report(timers):
+    instrument.record("stage", 0.002)
+    output = io.StringIO()
+    instrument.report(output)
+
+    assert "p50 ms" in output.getvalue() and "p99 ms" in output.getvalue()
+    assert "stage" in output.getvalue().splitlines()[1]
+
+
+@pytest.mark.parametrize(
+    "value,expected_modes",
+    [
+        ("1", ("timers",)),
+        ("timers,cprofile", ("timers", "cprofile")),
+        ("tracemalloc, tracemalloc", ("tracemalloc",)),
+    ],
+)
+def test_parse_modes(value, expected_modes):
+    assert instrument.parse_modes(value) == expected_modes
+
+
+def test_unknown_mode():
+    with pytest.raises(ValueError, match="unknown profile mode 'bogus'"):
+        instrument.parse_modes("timers,bogus")
+
+
+@pytest.fixture
+def profiled():
+    yield
+    instrument.reset()
+
+
+@pytest.mark.parametrize(
+    "options,env,expected_stages",
+    [
+        (["-profile"], {}, ("render", "encode", "write", "float_in_range")),
+        (["-profile", "cprofile"], {}, ("render", "float_in_range", "function calls")),
+        ([], {instrument.PROFILE_ENV: "1"}, ("render", "float_in_range")),
+    ],
+)
+def test_profile_report(tmp_path, monkeypatch, profiled, options, env, expected_stages):
+    for name, value in env.items():
+        monkeypatch.setenv(name, value)
+    instrument.enable_from_env()
+
+    out, err, returncode = run_circlemaker(["-d", 40, "-hue", 10, "-path", f"{tmp_path}/test.png", *options])
+    report = io.StringIO()
+    instrument.report(report)  # what is printed at exit
+
+    assert returncode == 0
+    for stage in expected_stages:
+        assert stage in report.getvalue()
+
+
+def test_profile_unknown_mode(tmp_path, profiled):
+    out, err, returncode = run_circlemaker(["-d", 40, "-hue", 10, "-path", f"{tmp_path}/test.png", "-profile", "bogus"])
+
+    assert returncode == 2
+    assert "error: unknown profile mode 'bogus'" in err
+    assert not instrument.enabled()
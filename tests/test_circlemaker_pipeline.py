@@ -0,0 +1,54 @@
+import io, threading
+import pytest
+from batch import read_manifest, run_batch
+from circlemaker import draw_image
+from encoders import Encoding
+from pipeline import stream_results
+from utils.harness import read_bytes
+
+
+@pytest.mark.smoke
+@pytest.mark.parametrize("threads,encoding", [(1, Encoding()), (3, Encoding()), (2, Encoding("png", 1, True))])
+def test_pipeline_output_and_order(tmp_path, threads, encoding):
+    rows = "".join(f"{d},{d},{tmp_path}/{d}.png,{d}\n" for d in range(10, 40))
+    manifest = io.StringIO(f"d,hue,path,seed\n{rows}400,10,{tmp_path}/bad.png,1\n41,10,{tmp_path}/missing/a.png,1\n")
+    out, err = io.StringIO(), io.StringIO()
+
+    rendered, failed = run_batch(read_manifest(manifest), out=out, err=err, workers=threads, encoding=encoding, pipeline=True)
+
+    assert (rendered, failed) == (30, 2)
+    assert out.getvalue().splitlines()[:-1] == [f"ok {tmp_path}/{d}.png" for d in range(10, 40)]
+    assert err.getvalue().splitlines() == [
+        "error: line 32: field d: Argument must be within 0 <= arg <= 399",
+        f"error: line 33: [Errno 2] No such file or directory: '{tmp_path}/missing/a.png'",
+    ]
+    for d in (10, 25, 39):
+        expected = io.BytesIO()
+        draw_image(d, d, expected, d, encoding)
+        assert read_bytes(f"{tmp_path}/{d}.png") == expected.getvalue()
+
+
+def test_pipeline_backpressure(tmp_path):
+    consumed = []
+
+    def entries():
+        for i in range(1000):
+            consumed.append(i)
+            yield i, {"d": 40, "hue": 10, "path": f"{tmp_path}/{i}.png"}
+
+    results = stream_results(entries(), threads=2, queue_size=4)
+    next(results)
+    threading.Event().wait(0.5)  # give the stages time to run ahead
+
+    assert len(consumed) < 20  # bounded by the queues, not by the manifest size
+    results.close()
+    assert threading.active_count() == 1
+
+
+def test_pipeline_manifest_error(tmp_path):
+    def entries():
+        yield 1, {"d": 40, "hue": 10, "path": f"{tmp_path}/a.ppm"}
+        raise OSError("manifest is gone")
+
+    with pytest.raises(OSError, match="manifest is gone"):
+        list(stream_results(entries(), threads=1, encoding=Encoding("ppm")))
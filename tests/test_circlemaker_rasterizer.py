@@ -0,0 +1,38 @@
+import pytest, numpy as np
+from circlemaker import render_array
+from rasterizer import render_stack
+
+
+def assert_matches_pillow(ds, hues, seeds):
+    stack = render_stack(ds, hues, seeds)
+
+    assert stack.shape == (len(ds), 400, 400, 3) and stack.dtype == np.uint8
+    for image, d, hue, seed in zip(stack, ds, hues, seeds):
+        mismatches = np.count_nonzero((image != render_array(d, hue, seed)).any(axis=2))
+        assert mismatches == 0, f"d={d} hue={hue}: {mismatches} pixels differ from Pillow"
+
+
+@pytest.mark.smoke
+@pytest.mark.parametrize("start", range(0, 400, 50))
+def test_every_integer_diameter_matches_pillow(start):
+    ds = list(range(start, start + 50))
+    assert_matches_pillow(ds, [(d * 7) % 361 for d in ds], ds)
+
+
+def test_fractional_diameters_match_pillow():
+    ds = [0.4, 0.5, 1.5, 2.25, 3.5, 75.5, 150.75, 151.5, 395.5, 398.9, 399]
+    assert_matches_pillow(ds, [0, 360, 0.5, 89.5, 200, 359.9, 120, 45, 250, 300, 150], list(range(len(ds))))
+
+
+def test_explicit_border_hues():
+    stack = render_stack([40, 80], [10, 20], border_hues=[0, 240])
+
+    assert (stack[0, 0, 0] == (255, 0, 0)).all() and (stack[0, 399, 200] == (255, 0, 0)).all()
+    assert (stack[1, 200, 0] == (0, 0, 255)).all() and (stack[1, 0, 399] == (0, 0, 255)).all()
+
+
+def test_mismatched_lengths():
+    with pytest.raises(ValueError):
+        render_stack([40, 80], [10])
+    with pytest.raises(ValueError):
+        render_stack([40, 80], [10, 20], seeds=[1])
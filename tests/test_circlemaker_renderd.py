@@ -0,0 +1,89 @@
+import os, socket, tempfile, threading
+import pytest
+from circlemaker import render_bytes
+from circleclient import main as client_main, request
+from encoders import Encoding
+from renderd import RenderServer
+from utils.harness import read_bytes, run_main
+
+
+pytestmark = pytest.mark.skipif(not hasattr(socket, "AF_UNIX"), reason="Unix sockets are not supported")
+
+
+@pytest.fixture
+def server():
+    # Unix socket paths are limited to about 100 characters, so don't use the long pytest tmp_path
+    with tempfile.TemporaryDirectory() as socket_dir:
+        socket_path = os.path.join(socket_dir, "s.sock")
+        with RenderServer(socket_path) as render_server:
+            thread = threading.Thread(target=render_server.serve_forever)
+            thread.start()
+            yield socket_path
+            render_server.shutdown()
+            thread.join()
+
+
+@pytest.mark.smoke
+@pytest.mark.parametrize(
+    "d,hue,seed,options,encoding",
+    [
+        (40, 0, 1, (), Encoding()),
+        (151, 360, 2, ("-palette", "-compress-level", "1"), Encoding("png", 1, True)),
+    ],
+)
+def test_client_renders_through_server(server, tmp_path, d, hue, seed, options, encoding):
+    returncode = client_main(["-d", str(d), "-hue", str(hue), "-seed", str(seed), "-path", f"{tmp_path}/test.png", "-socket", server, *options])
+
+    assert returncode == 0
+    assert read_bytes(f"{tmp_path}/test.png") == render_bytes(d, hue, seed, encoding)
+
+
+@pytest.mark.parametrize(
+    "payload,expected_error",
+    [
+        ((400, 10, "/test.png"), "Argument must be within 0 <= arg <= 399"),  # ((d,hue ,path), error)
+        ((10, "red", "/test.png"), "Argument must be a float type number"),
+        ((10, 10, "test.png"), "path must be an absolute path"),
+    ],
+)
+def test_server_validates_requests(server, payload, expected_error):
+    d, hue, path = payload
+    assert request(server, {"d": d, "hue": hue, "path": path}) == expected_error
+
+
+def test_server_reports_render_errors(server, tmp_path):
+    assert "No such file or directory" in request(server, {"d": 40, "hue": 10, "path": f"{tmp_path}/missing/test.png"})
+    assert request(server, {"d": 40, "hue": 10, "path": f"{tmp_path}/test.png"}) is None
+
+
+def test_client_validation_and_fallback(tmp_path):
+    out, err, returncode = run_main(client_main, ["-d", 400, "-hue", 10, "-path", f"{tmp_path}/test.png", "-socket", f"{tmp_path}/none.sock"])
+    assert returncode == 2
+    assert "error: argument -d: Argument must be within 0 <= arg <= 399" in err
+
+    args = ["-d", 40, "-hue", 10, "-seed", 3, "-path", f"{tmp_path}/test.png", "-socket", f"{tmp_path}/none.sock"]
+    out, err, returncode = run_main(client_main, args)
+    assert returncode == 0
+    assert read_bytes(f"{tmp_path}/test.png") == render_bytes(40, 10, 3)
+
+
+@pytest.mark.parametrize("options", [["-scene", "scene.csv"], ["-cache", "cache"], ["-incremental", "index.json"], ["-profile"]])
+def test_client_rejects_local_options(tmp_path, options):
+    out, err, returncode = run_main(client_main, ["-d", 40, "-hue", 10, "-path", f"{tmp_path}/test.png", *options])
+
+    assert returncode == 2
+    assert f"the render server only draws single images, use circlemaker.py for {options[0]}" in err
+    assert not os.path.exists(f"{tmp_path}/test.png")
+
+
+def test_client_does_not_render_twice_after_a_timeout(tmp_path, monkeypatch):
+    monkeypatch.setattr("circleclient.TIMEOUT_SECONDS", 0.2)
+    with tempfile.TemporaryDirectory() as socket_dir, socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as stalled:
+        stalled.bind(f"{socket_dir}/s.sock")
+        stalled.listen(1)  # accepts the connection but never answers
+
+        out, err, returncode = run_main(client_main, ["-d", 40, "-hue", 10, "-path", f"{tmp_path}/test.png", "-socket", f"{socket_dir}/s.sock"])
+
+    assert returncode == 1
+    assert "error: the render server failed: timed out" in err
+    assert not os.path.exists(f"{tmp_path}/test.png")
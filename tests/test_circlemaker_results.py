@@ -0,0 +1,62 @@
+import math
+import pytest, numpy as np
+from circlemaker import render_array
+from utils.circledetector import CircleDetector
+from utils.resultstore import ResultStore
+
+
+@pytest.mark.smoke
+def test_record_and_query_outliers(tmp_path):
+    with ResultStore(tmp_path / "results", batch_size=4) as store:
+        for d in [0, 3, 40, 151, 399]:
+            detector = CircleDetector(render_array(d, 120, seed=d, channels="BGR"), 120, method="auto")
+            store.record(detector, d, 120, seed=d, path=f"{d}.png")
+
+        outliers = store.radius_outliers(tolerance=1)
+        rows = store.rows(outliers)
+
+    assert len(store) == 5
+    assert [row["d"] for row in rows] == [0]  # no circle detected
+    assert math.isnan(rows[0]["radius"]) and rows[0]["method"] is not None
+    assert store.rows([2])[0] == {
+        "d": 40, "hue": 120, "seed": 40, "size": 400, "radius": 20, "red": 0, "green": 255, "blue": 0,
+        "method": "scanline", "seconds": pytest.approx(store.column("seconds")[2]), "path": "40.png",
+    }
+
+
+def test_batched_append_and_reopen(tmp_path):
+    store = ResultStore(tmp_path / "results")
+    ds = np.arange(100000) % 400
+    store.append({"d": ds, "hue": ds % 361, "radius": ds / 2 + (ds == 123) * 3, "method": np.zeros(len(ds))})
+    store.append({"d": [10], "hue": [20], "radius": [math.nan], "path": ["late.png"]})
+
+    reopened = ResultStore(tmp_path / "results")
+
+    assert len(reopened) == 100001
+    assert list(reopened.radius_outliers(tolerance=2)) == list(np.flatnonzero(ds == 123)) + [100000]
+    assert reopened.rows([100000])[0]["path"] == "late.png"
+    assert reopened.rows([0])[0]["path"] == "" and reopened.rows([0])[0]["seed"] is None
+
+
+def test_interrupted_append_is_rolled_back(tmp_path):
+    store = ResultStore(tmp_path / "results")
+    store.append({"d": [1, 2], "hue": [3, 4], "path": ["a", "b"]})
+    with open(tmp_path / "results" / "radius.bin", "ab") as f:
+        f.write(b"\0" * 12)  # a crash in the middle of the next append
+    with open(tmp_path / "results" / "path.data.bin", "ab") as f:
+        f.write(b"c")
+
+    reopened = ResultStore(tmp_path / "results")
+    reopened.append({"d": [5], "hue": [6], "path": ["d"]})
+
+    assert len(reopened) == 3
+    assert [row["path"] for row in reopened.rows(range(3))] == ["a", "b", "d"]
+    assert list(reopened.column("d")) == [1, 2, 5]
+
+
+def test_invalid_appends(tmp_path):
+    store = ResultStore(tmp_path / "results")
+
+    with pytest.raises(ValueError, match="the column hue holds 1 rows instead of 2"):
+        store.append({"d": [1, 2], "hue": [3]})
+    assert len(store) == 0 and len(store.radius_outliers(1)) == 0
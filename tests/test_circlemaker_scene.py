@@ -0,0 +1,144 @@
+import json, random
+import pytest, cv2 as cv, numpy as np
+from PIL import ImageColor
+from batch import read_manifest
+from encoders import Encoding
+from scene import MIN_GAP, Circle, SpatialGrid, draw_scene, random_scene, read_scene, render_scene
+from utils.circledetector import detect_circles
+from utils.harness import run_circlemaker
+
+
+def min_spacing(circles):
+    xs, ys, ds = (np.array(values, dtype=float) for values in list(zip(*circles))[:3])
+    distances = np.hypot(xs[:, None] - xs[None, :], ys[:, None] - ys[None, :]) - (ds[:, None] + ds[None, :]) / 2
+    np.fill_diagonal(distances, np.inf)
+    return distances.min()
+
+
+@pytest.mark.parametrize("d_range, big", [((1, 20), 0), ((0.5, 8), 3), ((2, 300), 0)])
+def test_grid_matches_brute_force(d_range, big):
+    rng = random.Random(3)
+    grid, added = SpatialGrid(), []
+    for i in range(big):  # a few big circles among small ones
+        circle = Circle(100 + 150 * i, 100 + 150 * i, 90, 0)
+        grid.add(circle, i)
+        added.append(circle)
+    for _ in range(500):
+        circle = Circle(rng.uniform(0, 400), rng.uniform(0, 400), rng.uniform(*d_range), 0)
+        overlaps = [i for i, o in enumerate(added) if np.hypot(circle.x - o.x, circle.y - o.y) < (circle.d + o.d) / 2 + MIN_GAP]
+        overlap = grid.overlapping(circle)
+        assert (overlap is not None) == bool(overlaps)
+        if overlaps:
+            assert overlap[0] == added[overlaps[0]]  # the first added
+        else:
+            grid.add(circle, len(added))
+            added.append(circle)
+    assert len(grid) == len(added)
+
+
+@pytest.mark.smoke
+def test_random_scene_places_thousands_of_circles():
+    circles = random_scene(3000, canvas_size=1024, d_range=(4, 12), seed=1)
+
+    assert len(circles) == 3000
+    assert min_spacing(circles) >= MIN_GAP
+    assert all(1 <= c.x - c.d / 2 and c.x + c.d / 2 <= 1023 and 1 <= c.y - c.d / 2 and c.y + c.d / 2 <= 1023 for c in circles)
+    assert random_scene(3000, canvas_size=1024, d_range=(4, 12), seed=1) == circles
+
+
+def test_random_scene_too_crowded():
+    with pytest.raises(ValueError, match="no room left"):
+        random_scene(1000, canvas_size=100, d_range=(10, 20), seed=1)
+
+
+@pytest.mark.smoke
+@pytest.mark.parametrize("channels", ["BGR", "RGB"])
+def test_detect_every_circle(channels):
+    circles = random_scene(1000, canvas_size=1024, d_range=(4, 24), seed=2)
+    img = np.asarray(render_scene(circles, seed=1, canvas_size=1024))
+
+    detected = detect_circles(img[..., ::-1] if channels == "BGR" else img, channels=channels)
+
+    assert len(detected) == len(circles)
+    points = np.array([(x, y) for x, y, _, _ in detected])
+    for circle in circles:
+        nearest = np.hypot(points[:, 0] - circle.x, points[:, 1] - circle.y).argmin()
+        x, y, r, rgb = detected[nearest]
+        assert abs(x - circle.x) <= 1 and abs(y - circle.y) <= 1  # Pillow truncates the box of the circle
+        assert r == pytest.approx(circle.d / 2, abs=1)
+        assert rgb == ImageColor.getrgb(f"hsv({circle.hue}, 100%, 100%)")
+
+
+def test_detect_circles_of_a_centered_circle():
+    img = np.asarray(render_scene([Circle(200, 200, 100, 240)], seed=1))
+
+    [(x, y, r, rgb)] = detect_circles(img, channels="RGB")
+
+    assert (x, y, r, rgb) == (200, 200, 50, (0, 0, 255))
+
+
+def test_draw_scene_encoding(tmp_path):
+    circles = random_scene(50, canvas_size=600, d_range=(10, 40), seed=4)
+
+    draw_scene(circles, f"{tmp_path}/scene.npy", seed=1, encoding=Encoding("npy"), canvas_size=600)
+
+    array = np.load(f"{tmp_path}/scene.npy")
+    assert array.shape == (600, 600, 3)
+    assert np.array_equal(array, np.asarray(render_scene(circles, seed=1, canvas_size=600)))
+    assert len(detect_circles(array, channels="RGB")) == 50
+
+
+def test_read_scene_reports_every_invalid_circle():
+    lines = [
+        {"x": 50, "y": 50, "d": 20, "hue": 10},
+        {"x": 60, "y": 60, "d": 20, "hue": 20},
+        {"x": 5, "y": 200, "d": 20, "hue": 30},
+        {"x": 200, "y": 200, "d": 20, "hue": 400},
+        {"x": 200, "y": 300, "hue": 50},
+    ]
+    manifest = [json.dumps(line) + "\n" for line in lines]
+
+    with pytest.raises(ValueError) as error:
+        read_scene(read_manifest(manifest))
+
+    assert str(error.value).splitlines() == [
+        "line 3: the circle overlaps the border",
+        "line 4: field hue: Argument must be within 0 <= arg <= 360",
+        "line 5: missing field 'd'",
+        "line 2: the circle overlaps the circle of line 1",
+    ]
+
+
+def test_cli_scene(tmp_path):
+    with open(f"{tmp_path}/scene.csv", "w") as f:
+        f.write("x,y,d,hue\n100,100,50,0\n300,100,50,120\n200,300,80,240\n")
+
+    out, err, code = run_circlemaker(["-scene", f"{tmp_path}/scene.csv", "-path", f"{tmp_path}/scene.png", "-seed", 1])
+
+    assert code == 0, err
+    assert "3 circles drawn" in out
+    detected = detect_circles(cv.imread(f"{tmp_path}/scene.png"))
+    assert [(round(x), round(y), rgb) for x, y, _, rgb in detected] == [
+        (100, 100, (255, 0, 0)), (300, 100, (0, 255, 0)), (200, 300, (0, 0, 255)),
+    ]
+
+
+@pytest.mark.parametrize("args, message", [
+    (["-palette"], "-scene cannot be combined with -batch or -palette"),
+    (["-batch", "jobs.csv"], "-scene cannot be combined with -batch or -palette"),
+])
+def test_cli_scene_invalid_options(tmp_path, args, message):
+    out, err, code = run_circlemaker(["-scene", "scene.csv", "-path", f"{tmp_path}/scene.png"] + args)
+
+    assert code == 2
+    assert message in err
+
+
+def test_cli_invalid_scene(tmp_path):
+    with open(f"{tmp_path}/scene.jsonl", "w") as f:
+        f.write('{"x": 100, "y": 100, "d": 50, "hue": 0}\n{"x": 110, "y": 100, "d": 50, "hue": 0}\n')
+
+    out, err, code = run_circlemaker(["-scene", f"{tmp_path}/scene.jsonl", "-path", f"{tmp_path}/scene.png"])
+
+    assert code == 2
+    assert "error: line 2: the circle overlaps the circle of line 1" in err
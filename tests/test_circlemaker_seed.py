@@ -0,0 +1,50 @@
+import io
+import pytest
+from batch import read_manifest, run_batch
+from circlemaker import draw_image
+from utils.harness import read_bytes, run_circlemaker
+
+
+@pytest.mark.smoke
+@pytest.mark.parametrize("d,hue,seed", [(40, 0, 0), (151, 360, 7), (399, 150, 123456)])
+def test_same_seed_same_bytes(tmp_path, d, hue, seed):
+    for name in ("first", "second"):
+        _, _, returncode = run_circlemaker(["-d", d, "-hue", hue, "-seed", seed, "-path", f"{tmp_path}/{name}.png"])
+        assert returncode == 0
+
+    assert read_bytes(f"{tmp_path}/first.png") == read_bytes(f"{tmp_path}/second.png")
+
+
+def test_seed_changes_border(tmp_path):
+    outputs = set()
+    for seed in range(5):
+        buffer = io.BytesIO()
+        draw_image(40, 100, buffer, seed)
+        outputs.add(buffer.getvalue())
+
+    assert len(outputs) > 1
+
+
+def test_batch_seed_matches_cli(tmp_path):
+    manifest = io.StringIO(f"d,hue,path,seed\n40,100,{tmp_path}/own.png,3\n40,100,{tmp_path}/default.png,\n")
+    rendered, failed = run_batch(read_manifest(manifest), out=io.StringIO(), seed=9)
+    assert (rendered, failed) == (2, 0)
+
+    for name, seed in (("own", 3), ("default", 9)):
+        expected = io.BytesIO()
+        draw_image(40, 100, expected, seed)
+        assert read_bytes(f"{tmp_path}/{name}.png") == expected.getvalue()
+
+
+@pytest.mark.parametrize(
+    "seed,expected_result",
+    [
+        (-1, (2, "error: argument -seed: Argument must be >= 0")),  # (seed ,(error_code, message))
+        ("notNumber", (2, "error: argument -seed: Argument must be an integer number")),
+    ],
+)
+def test_invalid_seed(tmp_path, seed, expected_result):
+    out, err, returncode = run_circlemaker(["-d", 40, "-hue", 10, "-seed", seed, "-path", f"{tmp_path}/test.png"])
+
+    assert returncode == expected_result[0]
+    assert expected_result[1] in err
@@ -0,0 +1,117 @@
+import io, json, os, subprocess, sys
+import pytest, cv2 as cv, numpy as np
+from PIL import Image
+from batch import read_manifest, run_batch
+from circlemaker import draw_image, render_array, render_bytes, render_image
+from encoders import PNG, Encoding
+from rasterizer import circle_mask
+from streampng import write_png
+from utils.circledetector import CircleDetector
+from utils.harness import read_bytes, run_circlemaker
+
+
+def decode(data):
+    return np.asarray(Image.open(io.BytesIO(data)).convert("RGB"))
+
+
+@pytest.mark.smoke
+@pytest.mark.parametrize("size", [1024, 1025, 1500])
+@pytest.mark.parametrize("encoding", [PNG, Encoding("png", 1, True), Encoding("png", 9, False)])
+def test_streamed_png_matches_pillow(size, encoding):
+    for d in [0, 0.5, 3, 7.3, 511.5, size / 2, size - 1.5, size - 1]:
+        output = io.BytesIO()
+        write_png(output, d, 200.5, 17, size, encoding)
+
+        expected = np.asarray(render_image(d, 200.5, 3, encoding.palette, size).convert("RGB")).copy()
+        border = decode(output.getvalue())[0, 0]
+        expected[[0, -1]] = border
+        expected[:, [0, -1]] = border
+        mismatches = np.count_nonzero((decode(output.getvalue()) != expected).any(axis=2))
+        assert mismatches == 0, f"d={d}: {mismatches} pixels differ from Pillow"
+
+
+def test_8k_canvas_is_streamed(tmp_path):
+    draw_image(100, 120, f"{tmp_path}/big.png", seed=1, encoding=Encoding("png", None, True), canvas_size=8192)
+
+    with Image.open(f"{tmp_path}/big.png") as image:
+        assert image.size == (8192, 8192) and image.mode == "P"
+        image = np.asarray(image)
+    assert np.count_nonzero(image == 1) == np.count_nonzero(circle_mask(100))  # the same box on a 400px canvas
+
+
+def test_small_canvases_use_pillow():
+    assert render_bytes(89, 89, 7, canvas_size=400) == render_bytes(89, 89, 7)
+    assert decode(render_bytes(89, 89, 7, canvas_size=64)).shape == (64, 64, 3)
+
+
+def test_cli_size(tmp_path):
+    out, err, code = run_circlemaker(["-d", "1500", "-hue", "90", "-size", "2048", "-path", f"{tmp_path}/big.png"])
+
+    assert code == 0, err
+    assert Image.open(f"{tmp_path}/big.png").size == (2048, 2048)
+
+
+@pytest.mark.parametrize("args, message", [
+    (["-d", "400", "-hue", "90"], "argument -d: Argument must be within 0 <= arg <= 399"),
+    (["-d", "800", "-hue", "90", "-size", "800"], "argument -d: Argument must be within 0 <= arg <= 799"),
+    (["-d", "10", "-hue", "90", "-size", "9000"], "argument -size: Argument must be within 3 <= arg <= 8192"),
+    (["-d", "10", "-hue", "90", "-size", "big"], "argument -size: Argument must be an integer number"),
+])
+def test_cli_d_range_follows_size(tmp_path, args, message):
+    out, err, code = run_circlemaker(args + ["-path", f"{tmp_path}/out.png"])
+
+    assert code == 2
+    assert message in err
+
+
+@pytest.mark.parametrize("options", [{}, {"workers": 2}, {"pipeline": True}])
+def test_batch_jobs_set_their_size(tmp_path, options):
+    jobs = [
+        {"d": 40, "hue": 10, "path": f"{tmp_path}/a.png", "seed": 1},
+        {"d": 1000, "hue": 20, "path": f"{tmp_path}/b.png", "seed": 2, "size": 1200},
+        {"d": 90, "hue": 30, "path": f"{tmp_path}/c.png", "seed": 3, "size": 100},
+        {"d": 500, "hue": 40, "path": f"{tmp_path}/d.png", "size": 400},
+    ]
+    manifest = io.StringIO("\n".join(json.dumps(job) for job in jobs))
+    err = io.StringIO()
+
+    rendered, failed = run_batch(read_manifest(manifest), out=io.StringIO(), err=err, **options)
+
+    assert (rendered, failed) == (3, 1)
+    assert "line 4: field d: Argument must be within 0 <= arg <= 399" in err.getvalue()
+    assert [Image.open(f"{tmp_path}/{name}.png").size[0] for name in "abc"] == [400, 1200, 100]
+    assert (decode(open(f"{tmp_path}/b.png", "rb").read()) == render_array(1000, 20, 2, canvas_size=1200)).all()
+
+
+@pytest.mark.parametrize("method", ["contour", "hough", "scanline"])
+def test_detector_follows_the_canvas_size(tmp_path, method):
+    draw_image(1100, 240, f"{tmp_path}/big.png", seed=1, canvas_size=1200)
+
+    detector = CircleDetector(cv.imread(f"{tmp_path}/big.png"), 240, method=method)
+
+    assert detector.get_circle_radius() == pytest.approx(550, abs=5 if method == "hough" else 1)
+
+
+def run_without_numpy(args, stdin=None):
+    # Pillow is the only install requirement, circlemaker must work when numpy cannot be imported
+    code = "import sys; sys.modules['numpy'] = None; import circlemaker; sys.exit(circlemaker.main(sys.argv[1:]))"
+    src = os.path.join(os.path.dirname(__file__), "..", "src")
+
+    return subprocess.run([sys.executable, "-c", code, *map(str, args)], input=stdin, capture_output=True, text=True,
+                          env={**os.environ, "PYTHONPATH": src})
+
+
+@pytest.mark.parametrize("options", [[], ["-pipeline"], ["-size", 1023], ["-size", 2000], ["-size", 2000, "-pipeline"]])
+def test_batch_without_numpy(tmp_path, options):
+    proc = run_without_numpy(["-batch", "-", *options], stdin=f"d,hue,path\n40,10,{tmp_path}/a.png\n")
+
+    assert proc.returncode == 0, proc.stderr
+    assert "1 rendered, 0 failed" in proc.stdout
+
+
+def test_draw_without_numpy(tmp_path):
+    proc = run_without_numpy(["-d", 1500, "-hue", 200, "-seed", 1, "-size", 2000, "-path", f"{tmp_path}/pillow.png"])
+    draw_image(1500, 200, f"{tmp_path}/streamed.png", seed=1, canvas_size=2000)
+
+    assert proc.returncode == 0, proc.stderr
+    assert np.array_equal(decode(read_bytes(f"{tmp_path}/pillow.png")), decode(read_bytes(f"{tmp_path}/streamed.png")))
@@ -0,0 +1,44 @@
+import pytest, numpy as np
+from circlemaker import render_array
+from rasterizer import circle_mask, render_stack
+from utils.circleverifier import count_mismatched_pixels, verify_circle
+
+
+@pytest.mark.smoke
+@pytest.mark.parametrize("start", range(0, 400, 100))
+def test_every_integer_diameter_is_verified(start):
+    for d in range(start, start + 100):
+        hue = (d * 7) % 361
+        assert count_mismatched_pixels(render_array(d, hue, d), d, hue) == 0
+
+
+@pytest.mark.parametrize("d,hue", [(0.5, 0), (3.5, 360), (75.5, 89.5), (151.25, 200), (398.9, 359.9)])
+def test_fractional_diameters_and_bgr(d, hue):
+    assert verify_circle(render_array(d, hue, channels="BGR"), d, hue, channels="BGR")
+
+
+def test_mismatches_are_counted():
+    img = render_array(100, 120)
+
+    assert count_mismatched_pixels(img, 102, 120) > 0
+    assert count_mismatched_pixels(img, 100, 240) == np.count_nonzero(circle_mask(100))
+    assert not verify_circle(img, 100, 121)
+
+
+def test_border_is_only_checked_without_crop():
+    img = render_stack([100], [120], border_hues=[0])[0]
+
+    assert count_mismatched_pixels(img, 100, 120) == 0
+    assert count_mismatched_pixels(img, 100, 120, crop_img=False) == 4 * 399
+
+
+def test_masks_are_shared_per_bounding_box():
+    assert circle_mask(100.2) is circle_mask(100.4)
+    assert not circle_mask(100).flags.writeable
+
+
+def test_bad_image():
+    with pytest.raises(ValueError):
+        count_mismatched_pixels(np.zeros((400, 300, 3), dtype=np.uint8), 100, 120)
+    with pytest.raises(ValueError):
+        count_mismatched_pixels(render_array(100, 120), 100, 120, channels="HSV")
@@ -4,8 +4,152 @@
     Cautions: Give the use of CV2 keep in mind the following
      * HSV range in CV2: Hue range is [0,179] "or [0, 255] for COLOR_BGR2HSV_FULL" not [0 360], Saturation range is [0,255] and Value range is [0,255] not [0 100%]
      * For approximations cv2 uses nearest integer rounding
+
+    The images are never copied by the detectors, so they can be read-only numpy.memmap views of raw canvases
+    (see load_canvases): scanning a big dataset then streams it from the page cache.
+
+    The circle detectors expect one circle centered on the image, detect_circles finds every circle of a scene
+    (see scene.py) wherever they are.
 """
-import cv2 as cv, numpy as np, math
+import cv2 as cv, numpy as np, math, os, time
+import instrument
+from colors import cv_hue
+
+METHODS = ("contour", "hough", "scanline", "auto")
+CHANNELS = ("BGR", "RGB")
+AUTO_MIN_RADIUS = 2  # the scanline radius of smaller circles is not trusted by the auto method
+
+
+def enclosing_circle_radius(contours, max_circle_area):
+    """_summary_
+    Return the radius of the minimum enclosing circle of the first contour that looks like a circle, otherwise none
+
+    Args:
+        contours (list): the cv2 contours of the circle mask
+        max_circle_area (float): the biggest area a circle can have on the image
+    """
+    for c in contours:
+        peri = cv.arcLength(c, True)
+        approx = cv.approxPolyDP(c, 0.0001 * peri, True)
+        area = cv.contourArea(c)
+        if len(approx) > 5 and area > 1 and area < max_circle_area:
+            ((x, y), r) = cv.minEnclosingCircle(c)
+            return r
+    return None
+
+
+def scanline_run_lengths(lines, center):
+    """_summary_
+    Return the length of the run of true pixels that goes through the center index of every line
+
+    Args:
+        lines (numpy.ndarray): a (k, n) bool array, one scanline per row
+        center (int): the index of the circle center on the lines
+    """
+    halves = []
+    for half in (lines[:, center::-1], lines[:, center:]):
+        outside = ~half
+        # argmax finds the first pixel out of the circle, a line that never leaves it runs until the image border
+        halves.append(np.where(outside.any(axis=1), outside.argmax(axis=1), half.shape[1]))
+    return np.maximum(halves[0] + halves[1] - 1, 0)
+
+
+def load_canvases(path, canvas_size=400):
+    """_summary_
+    Memory-map the canvases of a file as a read-only (N, canvas_size, canvas_size, 3) uint8 RGB array, nothing is read
+    before a canvas is used
+
+    Args:
+        path (string): a .npy array of canvases (like the circlemaker -archive ones) or a flat file of raw RGB canvases
+        canvas_size (int, optional): the width and height of the canvases of a raw file. Defaults to 400.
+    """
+    if path.lower().endswith(".npy"):
+        canvases = np.load(path, mmap_mode="r")
+        if canvases.ndim != 4 or canvases.shape[3] != 3 or canvases.dtype != np.uint8:
+            raise ValueError(f"{path} must hold a (N, height, width, 3) uint8 array, not {canvases.shape} {canvases.dtype}")
+        return canvases
+
+    frame_size = canvas_size * canvas_size * 3
+    size = os.path.getsize(path)
+    if size % frame_size:
+        raise ValueError(f"the size of {path} is not a multiple of a {canvas_size}x{canvas_size} RGB canvas")
+    if size == 0:  # numpy can't map an empty file
+        return np.empty((0, canvas_size, canvas_size, 3), dtype=np.uint8)
+    return np.memmap(path, dtype=np.uint8, mode="r", shape=(size // frame_size, canvas_size, canvas_size, 3))
+
+
+def pixel_rgb(img, loc, channels="BGR"):
+    """_summary_
+    Return the (r, g, b) color of the pixel at the location (x,y) of a BGR or RGB image
+    """
+    (c0, c1, c2) = img[loc[0], loc[1]]
+    return (c2, c1, c0) if channels == "BGR" else (c0, c1, c2)
+
+
+def hsv_bounds(circle_hue, color_range=(1, 0, 0)):
+    """_summary_
+    Return the (minHSV, maxHSV) cv2 HSV_FULL range of a circle hue
+
+    The range is centered on the hue cv2 computes from the color circlemaker draws (see colors.cv_hue), so the
+    hues drawn pure red, 360 and the ones close to it, get the range of 0 like the image pixels do.
+
+    Args:
+        circle_hue (int): the expected hue of the circle in a range of [0 360].
+        color_range (tuple, optional): Color tolerance. Defaults to (1,0,0).
+    """
+    return cv_hue_bounds(cv_hue(circle_hue), color_range)
+
+
+def cv_hue_bounds(h, color_range=(1, 0, 0)):
+    """_summary_
+    Return the (minHSV, maxHSV) cv2 HSV_FULL range of a cv2 hue [0 255]
+    """
+    s = v = 255
+    return (
+        (h - color_range[0], s - color_range[1], v - color_range[2]),
+        (h + color_range[0], s + color_range[1], v + color_range[2]),
+    )
+
+
+def detect_circles(img, crop_img=True, channels="BGR", min_area=1):
+    """_summary_
+    Detect every circle of a scene image with a single labeled connected-components pass
+
+    The background is white and the circles never touch each other (see scene.MIN_GAP), so every connected
+    component of the non white pixels is one circle: its bounding box gives the radius like the scanline
+    method, its centroid gives the center and the pixel at the centroid gives the color. The cost is one pass
+    over the image whatever the number of circles.
+
+    Args:
+        img (numpy.ndarray): the BGR or RGB image.
+        crop_img (bool, optional): ignore the border of the image. Defaults to True.
+        channels (string, optional): the channels order of the image, "BGR" like cv2 images or "RGB". Defaults to "BGR".
+        min_area (int, optional): the smallest component, in pixels, taken as a circle. Defaults to 1.
+
+    Returns:
+        list (tuples): the (x, y, r, (r, g, b)) of every circle in the coordinates of the full image, sorted by y then x
+    """
+    if channels not in CHANNELS:
+        raise ValueError(f"unknown channels '{channels}', must be one of {', '.join(CHANNELS)}")
+    offset = 1 if crop_img else 0
+    if crop_img:
+        img = img[1:-1, 1:-1]  # without the border
+
+    mask = cv.bitwise_not(cv.inRange(img, (255, 255, 255), (255, 255, 255)))
+    count, _, stats, centroids = cv.connectedComponentsWithStats(mask, connectivity=8)
+
+    circles = []
+    for label in range(1, count):  # the label 0 is the background
+        _, _, width, height, area = stats[label]
+        if area < min_area:
+            continue
+        x, y = centroids[label]
+        # a run of n pixels spans n - 1 pixels between the centers of its end pixels, like the scanline method
+        r = float(width - 1 + height - 1) / 4
+        rgb = pixel_rgb(img, (round(y), round(x)), channels)
+        circles.append((float(x) + offset, float(y) + offset, r, tuple(int(c) for c in rgb)))
+
+    return sorted(circles, key=lambda circle: (circle[1], circle[0]))
 
 
 class CircleDetector:
@@ -18,58 +162,52 @@ class CircleDetector:
          circle_hue  (int): the expected hue of the circle in a range of [0 360].
          color_range (tuple, optional): Color tolerance. Defaults to (1,0,0).
          crop_img    (bool, optional): crop the border from the image. Defaults to True.
+         method      (string, optional): the radius detection method, one of METHODS. Defaults to "contour".
+         channels    (string, optional): the channels order of the image, "BGR" like cv2 images or "RGB". Defaults to "BGR".
+
+    The "auto" method runs the cheapest method first and only escalates when its result is not trusted: the
+    scanline radius is kept unless the circle is tiny or its rows and columns disagree, then the contour radius
+    is kept unless several contours were found, and the hough method is the last resort.
     """
 
-    def __init__(self, img_path, circle_hue, color_range=(1, 0, 0), crop_img=True):
+    def __init__(self, img_path, circle_hue, color_range=(1, 0, 0), crop_img=True, method="contour", channels="BGR"):
+        if method not in METHODS:
+            raise ValueError(f"unknown method '{method}', must be one of {', '.join(METHODS)}")
+        if channels not in CHANNELS:
+            raise ValueError(f"unknown channels '{channels}', must be one of {', '.join(CHANNELS)}")
+        self.__method = method
+        self.__channels = channels
         self.__img = img_path
+        self.__canvas_size = len(img_path)  # the hough parameters follow the canvas size
         if crop_img:
             self.__img = self.__img[1:-1, 1:-1]  # without the border
-        self.__circle_hsv = self.__get_hsv_color((circle_hue, 100, 100))
+        self.__minHSV, self.__maxHSV = hsv_bounds(circle_hue, color_range)
 
         circle_area = math.pi * math.pow(round(len(self.__img) / 2), 2)
         self.__max_circle_area = circle_area + 1000  # the "1000" is just an additional tolerance
-        if self.__circle_hsv[0] == 255:  # just to handle the image h values that get converted to 0
-            self.__minHSV = (
-                0,
-                self.__circle_hsv[1] - color_range[1],
-                self.__circle_hsv[2] - color_range[2],
-            )
-
-            self.__maxHSV = (
-                color_range[0],
-                self.__circle_hsv[1] + color_range[1],
-                self.__circle_hsv[2] + color_range[2],
-            )
-        else:
-            self.__minHSV = (
-                self.__circle_hsv[0] - color_range[0],
-                self.__circle_hsv[1] - color_range[1],
-                self.__circle_hsv[2] - color_range[2],
-            )
-
-            self.__maxHSV = (
-                self.__circle_hsv[0] + color_range[0],
-                self.__circle_hsv[1] + color_range[1],
-                self.__circle_hsv[2] + color_range[2],
-            )
 
         self.__circle_detected = False
         self.__circle = None
+        self.__mask = None
+        self.__timings = {}
+        self.__used_method = None
+        self.__contour_count = 0
+        self.__scanline_diameters = (0, 0)
 
-    def __get_hsv_color(self, normal_hsv_color):
+    def __get_mask(self):
         """_summary_
-        Convert hsv numbers from normal 360 100% 100% to the CV2 hsv numbers [179,255,255]
-        Args:
-            normal_hsv_color (tuple): hsv color in normal range ([ 0 360] , [ 0 100%] , [0 100%])
+        Return the binary mask of the image pixels within the needed hsv range, it is computed once per image
         """
-        h = round((normal_hsv_color[0] / 360) * 255)
-        s = round((normal_hsv_color[1] / 100) * 255)
-        v = round((normal_hsv_color[2] / 100) * 255)
-        return (h, s, v)
+        if self.__mask is None:
+            with instrument.timer("detect.hsv"):
+                hsv_img = cv.cvtColor(self.__img, cv.COLOR_BGR2HSV_FULL if self.__channels == "BGR" else cv.COLOR_RGB2HSV_FULL)
+            with instrument.timer("detect.mask"):
+                self.__mask = cv.inRange(hsv_img, self.__minHSV, self.__maxHSV)
+        return self.__mask
 
     def __get_masked_image(self):
         """_summary_
-        Clean an image and return the image in BRG color with only the needed hsv_color
+        Clean an image and return the image in its channels order with only the needed hsv_color
 
         Args:
             img (cv2.image): the cv2 image that you need to clean it
@@ -77,15 +215,16 @@ class CircleDetector:
             color_range (tuple, optional): Color tolerance. Defaults to (1,0,0).
 
         Returns:
-            cv2.image: the BGR masked image
+            cv2.image: the masked image
         """
+        # bitwise_and writes into a new image, the (maybe read-only) source image is not copied
+        return cv.bitwise_and(self.__img, self.__img, mask=self.__get_mask())
 
-        img = self.__img.copy()
-        hsv_img = cv.cvtColor(img, cv.COLOR_BGR2HSV_FULL)
-
-        mask = cv.inRange(hsv_img, self.__minHSV, self.__maxHSV)
-
-        return cv.bitwise_and(img, img, mask=mask)
+    def __get_masked_gray_image(self):
+        """_summary_
+        Return the masked image in gray
+        """
+        return cv.cvtColor(self.__get_masked_image(), cv.COLOR_BGR2GRAY if self.__channels == "BGR" else cv.COLOR_RGB2GRAY)
 
     def __circle_detection_by_minEnclosingCircle(self):
         """_summary_
@@ -104,26 +243,22 @@ class CircleDetector:
             list (tuples): number of the circles found
         """
 
-        gray_img = cv.cvtColor(self.__get_masked_image(), cv.COLOR_BGR2GRAY)
+        gray_img = self.__get_masked_gray_image()
 
         # gray_img = cv.medianBlur(gray_img, 11) # commented out no need for it
 
-        _, thresh = cv.threshold(gray_img, 0, 255, cv.THRESH_BINARY + cv.THRESH_OTSU)  # Not commented out but actually no need for it
-
-        # Morph open --> commented out no need for it
-        # kernel = cv.getStructuringElement(cv.MORPH_ELLIPSE, (5,5))
-        # opening = cv.morphologyEx(thresh, cv.MORPH_CLOSE, kernel, iterations=3)
-
-        # Find contours and filter using contour area and aspect ratio
-        contours, _ = cv.findContours(thresh, cv.RETR_EXTERNAL, cv.CHAIN_APPROX_SIMPLE)
-        for c in contours:
-            peri = cv.arcLength(c, True)
-            approx = cv.approxPolyDP(c, 0.0001 * peri, True)
-            area = cv.contourArea(c)
-            if len(approx) > 5 and area > 1 and area < self.__max_circle_area:
-                ((x, y), r) = cv.minEnclosingCircle(c)
-                return r
-        return None
+        with instrument.timer("detect.find_contours"):
+            _, thresh = cv.threshold(gray_img, 0, 255, cv.THRESH_BINARY + cv.THRESH_OTSU)  # Not commented out but actually no need for it
+
+            # Morph open --> commented out no need for it
+            # kernel = cv.getStructuringElement(cv.MORPH_ELLIPSE, (5,5))
+            # opening = cv.morphologyEx(thresh, cv.MORPH_CLOSE, kernel, iterations=3)
+
+            # Find contours and filter using contour area and aspect ratio
+            contours, _ = cv.findContours(thresh, cv.RETR_EXTERNAL, cv.CHAIN_APPROX_SIMPLE)
+        self.__contour_count = len(contours)
+        with instrument.timer("detect.enclose"):
+            return enclosing_circle_radius(contours, self.__max_circle_area)
 
     def __circle_detection_by_houghCircles(self):
         """_summary_
@@ -141,16 +276,18 @@ class CircleDetector:
             list (tuples): number of the circles found
         """
         # detect circles in the image, most of the values are an arbitrary number chosen after trial and error
-        gray_img = cv.cvtColor(self.__get_masked_image(), cv.COLOR_BGR2GRAY)
+        # on 400px canvases, the distance and the radius limits are half the canvas
+        gray_img = self.__get_masked_gray_image()
+        half_size = self.__canvas_size // 2
         circles = cv.HoughCircles(
             image=gray_img,
             method=cv.HOUGH_GRADIENT,
             dp=3.2,
-            minDist=200,
+            minDist=half_size,
             param1=120,
             param2=60,
             minRadius=15,
-            maxRadius=200,
+            maxRadius=half_size,
         )
         # ensure at least some circles were found
         if circles is not None and len(circles) == 1:
@@ -161,12 +298,13 @@ class CircleDetector:
 
         return None
 
-    def __circle_detection_naive_method(self):
+    def __circle_detection_by_scanlines(self):
         """_summary_
 
-        This is a very naive solution: I will check the pixel color in the centre of
-        the image if it is within the accepted color then I will move to the -x direction
-        until I reach to unaccepted color or the image board and return my steps.
+        This method measures the circle on the scanlines crossing the image center: the three middle rows and
+        the three middle columns of the mask. On each line the run of circle pixels through the center is found
+        with numpy (argmax of the first pixel out of the circle) instead of walking pixel by pixel, the widest
+        row and the widest column give the diameter and the radius is their average.
 
         This solution base on the following facts/assumptions:
         * The center of the circle is always the center of the image
@@ -175,48 +313,69 @@ class CircleDetector:
 
         Cautions:
         * The method should not be used if the previous assumptions may changes
-        * The method can't detect accurately circle with radius less than 2
+        * The method can't detect accurately circle with radius less than 1.5px (diameter == 3px)
         * The method detect the circle radius with accuracy equal to the actual value +/- 0.5 pixel "+/- 1 pixel of the circle diameter"
 
-
-        Args:
-            img (cv2.image): the cv2 image
-            hsv_color (tuple): the mask color
-            color_range (tuple, optional): Color tolerance. Defaults to (1,0,0).
-
         Returns:
-        int : the circle radius or None of radius less than 2
+        float : the circle radius or None of radius less than 1.5
         """
-        img = self.__img.copy()
-        hsv_image = cv.cvtColor(img, cv.COLOR_BGR2HSV_FULL)
+        mask = self.__get_mask() > 0
+        c = len(mask) // 2
+        rows = scanline_run_lengths(mask[c - 1 : c + 2], c)
+        columns = scanline_run_lengths(mask[:, c - 1 : c + 2].T, c)
+        self.__scanline_diameters = (rows.max(), columns.max())
 
-        img_size = len(img)
-        x = int(img_size / 2)
-        y = int(img_size / 2)
-        while self.__pixel_color_within_range(hsv_image, (x - 1, y - 1)):
-            x -= 1
-            if x <= 0:
-                break
-        r = int(img_size / 2) - x
+        # a run of n pixels spans n - 1 pixels between the centers of its end pixels, like the contour points
+        r = float(rows.max() - 1 + columns.max() - 1) / 4
 
-        if r < 2:  # for r less than 2 the results are not accurate hence returning none
+        if r < 1.5:  # for r less than 1.5 the results are not accurate hence returning none
             return None
 
         return r
 
-    def __pixel_color_within_range(self, img, loc, minHSV, maxHSV):
+    def __run_method(self, method):
         """_summary_
-        returns true if the color of the pixel at the specified location was within the needed color range
-        Args:
-            img : is cv2 hsv image
-            loc : location (x,y) on the image
+        Detect the circle radius with one method and record how long it took
+        """
+        detection = {
+            "contour": self.__circle_detection_by_minEnclosingCircle,
+            "hough": self.__circle_detection_by_houghCircles,
+            "scanline": self.__circle_detection_by_scanlines,
+        }[method]
+        start = time.perf_counter()
+        r = detection()
+        self.__timings[method] = time.perf_counter() - start
+        if instrument.enabled():
+            instrument.record(f"detect.{method}", self.__timings[method])
+        self.__used_method = method
+        return r
+
+    def __circle_detection_auto(self):
+        """_summary_
+        Escalate from the cheapest method to the more expensive ones until a result is trusted
         """
-        minHSV = self.__minHSV
-        maxHSV = self.__maxHSV
-        h, s, v = img[loc[0], loc[1]]
-        if h >= (minHSV[0]) and s >= (minHSV[1]) and v >= (minHSV[2]):
-            return h <= (maxHSV[0]) and s <= (maxHSV[1]) and v <= (maxHSV[2])
-        return False
+        r = self.__run_method("scanline")
+        rows, columns = self.__scanline_diameters
+        if r is not None and r >= AUTO_MIN_RADIUS and abs(int(rows) - int(columns)) <= 1:
+            return r
+
+        r = self.__run_method("contour")
+        if r is not None and self.__contour_count == 1:
+            return r
+
+        hough_r = self.__run_method("hough")
+        if hough_r is not None or r is None:
+            return hough_r
+        self.__used_method = "contour"
+        return r
+
+    def __detect_circle(self):
+        """_summary_
+        Detect the circle radius with the selected method
+        """
+        if self.__method == "auto":
+            return self.__circle_detection_auto()
+        return self.__run_method(self.__method)
 
     def get_circle_rgb_color(self):
         """_summary_
@@ -226,13 +385,12 @@ class CircleDetector:
         if self.__circle_detected == False and self.__circle is None:
 
             # Detect the circle
-            self.__circle = self.__circle_detection_by_minEnclosingCircle()
+            self.__circle = self.__detect_circle()
             self.__circle_detected = True
 
         if self.__circle is not None:
             x = round(len(self.__img) / 2)
-            (b, g, r) = self.__img[x, x]
-            return (r, g, b)
+            return pixel_rgb(self.__img, (x, x), self.__channels)
 
         return None
 
@@ -243,7 +401,88 @@ class CircleDetector:
         if self.__circle_detected == False and self.__circle is None:
 
             # Detect the circle
-            self.__circle = self.__circle_detection_by_minEnclosingCircle()
+            self.__circle = self.__detect_circle()
             self.__circle_detected = True
 
         return self.__circle
+
+    def get_detection_method(self):
+        """_summary_
+        Return the method that gave the radius, none before the detection
+        """
+        return self.__used_method
+
+    def get_timings(self):
+        """_summary_
+        Return the seconds spent by every method that ran during the detection
+        """
+        return dict(self.__timings)
+
+
+class BatchCircleDetector:
+    """_summary_
+
+    Detect the circles of many images produced by circlemaker in one call and extract their color and radius
+
+    The work shared by the images is done once: the HSV range of every cv2 hue is looked up in a table built
+    at construction, and the HSV and mask buffers are reused between images of the same size. The contours are
+    found on the inRange mask directly, it is exactly what thresholding the gray masked image gives back.
+
+      Args:
+         color_range (tuple, optional): Color tolerance. Defaults to (1,0,0).
+         crop_img    (bool, optional): crop the border from the images. Defaults to True.
+         channels    (string, optional): the channels order of the images, "BGR" like cv2 images or "RGB". Defaults to "BGR".
+    """
+
+    def __init__(self, color_range=(1, 0, 0), crop_img=True, channels="BGR"):
+        if channels not in CHANNELS:
+            raise ValueError(f"unknown channels '{channels}', must be one of {', '.join(CHANNELS)}")
+        self.__crop_img = crop_img
+        self.__channels = channels
+        # the (minHSV, maxHSV) range of every cv2 hue [0 255]
+        self.__bounds = [cv_hue_bounds(h, color_range) for h in range(256)]
+        self.__buffers = {}
+
+    def __get_buffers(self, shape):
+        """_summary_
+        Return the (hsv, mask) buffers of an image shape, they are allocated once per shape
+        """
+        if shape not in self.__buffers:
+            self.__buffers[shape] = (np.empty(shape, dtype=np.uint8), np.empty(shape[:2], dtype=np.uint8))
+        return self.__buffers[shape]
+
+    def detect(self, img, circle_hue):
+        """_summary_
+        Detect the circle of one image and return its (radius, rgb color), both none if no circle is detected
+
+        Args:
+            img (cv2.image): the image produced by circle maker
+            circle_hue (int): the expected hue of the circle in a range of [0 360].
+        """
+        if self.__crop_img:
+            img = img[1:-1, 1:-1]  # without the border
+        hsv_img, mask = self.__get_buffers(img.shape)
+        cv.cvtColor(img, cv.COLOR_BGR2HSV_FULL if self.__channels == "BGR" else cv.COLOR_RGB2HSV_FULL, dst=hsv_img)
+        min_hsv, max_hsv = self.__bounds[cv_hue(circle_hue)]
+        cv.inRange(hsv_img, min_hsv, max_hsv, dst=mask)
+
+        contours, _ = cv.findContours(mask, cv.RETR_EXTERNAL, cv.CHAIN_APPROX_SIMPLE)
+        max_circle_area = math.pi * math.pow(round(len(img) / 2), 2) + 1000  # the "1000" is just an additional tolerance
+        r = enclosing_circle_radius(contours, max_circle_area)
+        if r is None:
+            return None, None
+
+        x = round(len(img) / 2)
+        return r, pixel_rgb(img, (x, x), self.__channels)
+
+    def detect_all(self, imgs, circle_hues):
+        """_summary_
+        Detect the circles of many images, return the list of their (radius, rgb color)
+
+        Args:
+            imgs (sequence): the images, a list or a (N, height, width, 3) array like load_canvases gives
+            circle_hues (sequence): the expected hue of every circle in a range of [0 360].
+        """
+        if len(imgs) != len(circle_hues):
+            raise ValueError("imgs and circle_hues must have the same length")
+        return [self.detect(img, circle_hue) for img, circle_hue in zip(imgs, circle_hues)]
@@ -0,0 +1,46 @@
+"""_summary_
+    This module verifies the images produced by circlemaker analytically, without OpenCV
+
+    Circle-Maker always centers the circle on the canvas, so the expected image of a (d, hue) pair is known: the
+    pixels of the circle mask drawn by the same rasterization rules as draw_image (see rasterizer.circle_mask) have
+    the circle color and the others are white. The verification is one vectorized compare against that image.
+
+    Cautions:
+     * The border is cropped like CircleDetector does, its hue is random unless a seed is used
+     * The masks are cached per diameter, the verifier is much faster than detecting the circle
+"""
+import numpy as np
+from colors import WHITE, hue_bgr, hue_rgb
+from rasterizer import circle_mask
+
+
+def count_mismatched_pixels(img, d, hue, channels="RGB", crop_img=True):
+    """_summary_
+    Return the number of pixels that differ from the expected image of a circle
+
+    Args:
+        img (numpy.ndarray): the (height, width, 3) uint8 image produced by circle maker
+        d (float): the expected diameter of the circle
+        hue (float): the expected hue of the circle in a range of [0 360].
+        channels (string, optional): the channels order of img, "RGB" or "BGR" like cv2 images. Defaults to "RGB".
+        crop_img (bool, optional): ignore the border of the image. Defaults to True.
+    """
+    if channels not in ("RGB", "BGR"):
+        raise ValueError(f"unknown channels '{channels}', must be RGB or BGR")
+    if img.ndim != 3 or img.shape[0] != img.shape[1] or img.shape[2] != 3:
+        raise ValueError(f"expected a square (size, size, 3) image, not {img.shape}")
+
+    fill = np.array(hue_bgr(hue) if channels == "BGR" else hue_rgb(hue), dtype=np.uint8)
+    mask = circle_mask(d, img.shape[0])
+    expected = np.where(mask[..., None], fill, np.array(WHITE, dtype=np.uint8))
+
+    if crop_img:
+        img, expected = img[1:-1, 1:-1], expected[1:-1, 1:-1]  # without the border
+    return int(np.count_nonzero((img != expected).any(axis=2)))
+
+
+def verify_circle(img, d, hue, channels="RGB", crop_img=True, tolerance=0):
+    """_summary_
+    Return true if the image holds the expected circle with at most tolerance mismatched pixels
+    """
+    return count_mismatched_pixels(img, d, hue, channels, crop_img) <= tolerance
@@ -0,0 +1,67 @@
+"""_summary_
+    An in-process harness running circlemaker the way its command line does
+
+    Spawning a python process per test case costs far more than drawing the circle, so the tests call
+    circlemaker.main directly and capture its output. Every case writes to its own path (pytest tmp_path)
+    or renders in memory, so the cases can run in parallel with pytest-xdist ("pytest -n auto").
+"""
+import contextlib, io, os, sys
+import circlemaker
+
+GRID_ENV = "CIRCLEMAKER_FULL_GRID"
+
+
+def run_main(main, args, stdin=None):
+    """_summary_
+    Run the main function of a command line script with the arguments and return its (out, err, returncode)
+
+    Args:
+        main (function): the main(argv) of the script, e.g. circlemaker.main or circleclient.main
+        args (list): the command line arguments without the program name, they are converted to strings
+        stdin (string, optional): the text read from stdin, e.g. a "-batch -" manifest. Defaults to None.
+    """
+    out, err = io.StringIO(), io.StringIO()
+    saved_stdin = sys.stdin
+    sys.stdin = io.StringIO(stdin or "")
+    try:
+        with contextlib.redirect_stdout(out), contextlib.redirect_stderr(err):
+            try:
+                returncode = main([str(arg) for arg in args])
+            except SystemExit as e:  # argparse exits on invalid arguments
+                returncode = e.code
+    finally:
+        sys.stdin = saved_stdin
+    return out.getvalue(), err.getvalue(), returncode
+
+
+def run_circlemaker(args, stdin=None):
+    """_summary_
+    Run circlemaker with the command line arguments and return its (out, err, returncode), see run_main
+    """
+    return run_main(circlemaker.main, args, stdin)
+
+
+def read_bytes(path):
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def value_within_range(actual_v, expected_v, tolerance):
+    return actual_v >= (expected_v - tolerance) and actual_v <= (expected_v + tolerance)
+
+
+def full_grid():
+    """_summary_
+    Return true if the whole diameter x hue grid must be swept, set the CIRCLEMAKER_FULL_GRID environment variable to 1
+    """
+    return os.environ.get(GRID_ENV, "") not in ("", "0")
+
+
+def grid_values(vmin, vmax, step):
+    """_summary_
+    Return the values from vmin to vmax by step, vmax included, or every integer value when the full grid is swept
+    """
+    values = list(range(vmin, vmax + 1, 1 if full_grid() else step))
+    if values[-1] != vmax:
+        values.append(vmax)
+    return values
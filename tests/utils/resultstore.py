@@ -0,0 +1,195 @@
+"""_summary_
+    A compact, appendable columnar store of detection results, to analyze a validation run after the fact
+
+    A store is a directory holding one raw little-endian file per column ("<name>.bin") and a schema.json. Every
+    detected image is one row: the job parameters (d, hue, seed, canvas size and path), the detected radius and
+    RGB color, the method that gave the radius and the detection seconds. Appending a batch of rows is one write
+    per column, and a query memory-maps the columns it needs and filters them with numpy, so scanning the results
+    of a million images only reads a few bytes per image from the page cache.
+
+    Cautions:
+     * A store has a single writer, use one store per process (e.g. per pytest-xdist worker)
+     * The columns are written one after the other, an interrupted append is rolled back to the last whole row
+       when the store is opened again
+     * The rows recorded by record are buffered, they are written every batch_size rows and by flush or close
+"""
+import json, math, os
+import numpy as np
+from utils.circledetector import METHODS
+
+SCHEMA_VERSION = 1
+COLUMNS = (
+    ("d", "<f8"),
+    ("hue", "<f8"),
+    ("seed", "<i8"),  # -1 without a seed
+    ("size", "<i4"),
+    ("radius", "<f8"),  # nan when no circle was detected
+    ("red", "u1"),
+    ("green", "u1"),
+    ("blue", "u1"),
+    ("method", "u1"),  # the index in METHODS, NO_METHOD before a detection
+    ("seconds", "<f8"),
+)
+NO_METHOD = 255
+DEFAULTS = {"seed": -1, "size": 400, "radius": math.nan, "red": 0, "green": 0, "blue": 0, "method": NO_METHOD, "seconds": 0}
+
+
+class ResultStore:
+    """_summary_
+    Record the results of CircleDetector runs into a columnar store and query them
+
+      Args:
+         directory   (string): the store directory, created if it does not exist.
+         batch_size  (int, optional): the rows buffered by record before they are written. Defaults to 4096.
+    """
+
+    def __init__(self, directory, batch_size=4096):
+        self.directory = directory
+        self.batch_size = batch_size
+        self.__dtypes = dict(COLUMNS)
+        self.__pending = []
+        os.makedirs(directory, exist_ok=True)
+
+        schema_path = os.path.join(directory, "schema.json")
+        schema = {"version": SCHEMA_VERSION, "columns": [list(column) for column in COLUMNS]}
+        if os.path.exists(schema_path):
+            with open(schema_path) as f:
+                if json.load(f) != schema:
+                    raise ValueError(f"{directory} is not a result store of version {SCHEMA_VERSION}")
+        else:
+            with open(schema_path, "w") as f:
+                json.dump(schema, f)
+        self.__rows = self.__repair()
+
+    def __path(self, name):
+        return os.path.join(self.directory, f"{name}.bin")
+
+    def __repair(self):
+        """_summary_
+        Return the number of whole rows, truncating the columns and the paths an interrupted append left longer
+        """
+        files = COLUMNS + (("path.offsets", "<i8"),)
+        sizes = ((os.path.getsize(self.__path(name)) if os.path.exists(self.__path(name)) else 0, dtype) for name, dtype in files)
+        rows = min(size // np.dtype(dtype).itemsize for size, dtype in sizes)
+
+        for name, dtype in files:
+            with open(self.__path(name), "ab") as f:
+                f.truncate(rows * np.dtype(dtype).itemsize)
+        end = int(np.fromfile(self.__path("path.offsets"), dtype="<i8", count=rows)[-1]) if rows else 0
+        with open(self.__path("path.data"), "ab") as f:
+            f.truncate(end)
+        return rows
+
+    def __len__(self):
+        return self.__rows + len(self.__pending)
+
+    def append(self, rows):
+        """_summary_
+        Append a batch of rows given as columns: a dict of equally long sequences, the missing columns get DEFAULTS
+
+        Args:
+            rows (dict): "d" and "hue" are required, any other column and "path" (strings) are optional
+        """
+        count = len(rows["d"])
+        columns = {}
+        for name, dtype in COLUMNS:
+            values = rows.get(name)
+            columns[name] = np.full(count, DEFAULTS[name], dtype=dtype) if values is None else np.asarray(values, dtype=dtype)
+            if len(columns[name]) != count:
+                raise ValueError(f"the column {name} holds {len(columns[name])} rows instead of {count}")
+        paths = [str(path).encode() for path in rows.get("path", [""] * count)]
+        if len(paths) != count:
+            raise ValueError(f"the column path holds {len(paths)} rows instead of {count}")
+        if count == 0:
+            return
+
+        with open(self.__path("path.data"), "ab") as f:
+            start = f.tell()
+            f.write(b"".join(paths))
+        # the paths first and the offsets last: a row exists once all of its columns are written
+        for name, _ in COLUMNS:
+            with open(self.__path(name), "ab") as f:
+                f.write(columns[name].tobytes())
+        with open(self.__path("path.offsets"), "ab") as f:
+            f.write((start + np.cumsum([len(path) for path in paths], dtype="<i8")).astype("<i8").tobytes())
+        self.__rows += count
+
+    def record(self, detector, d, hue, seed=None, size=400, path=""):
+        """_summary_
+        Buffer the result of a CircleDetector for the job (d, hue, seed, size, path), running the detection if needed
+        """
+        radius = detector.get_circle_radius()
+        rgb = detector.get_circle_rgb_color() if radius is not None else None
+        method = detector.get_detection_method()
+        self.__pending.append({
+            "d": d,
+            "hue": hue,
+            "seed": -1 if seed is None else seed,
+            "size": size,
+            "radius": math.nan if radius is None else radius,
+            "red": 0 if rgb is None else rgb[0],
+            "green": 0 if rgb is None else rgb[1],
+            "blue": 0 if rgb is None else rgb[2],
+            "method": NO_METHOD if method is None else METHODS.index(method),
+            "seconds": sum(detector.get_timings().values()),
+            "path": path,
+        })
+        if len(self.__pending) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        """_summary_
+        Write the rows buffered by record
+        """
+        if self.__pending:
+            pending, self.__pending = self.__pending, []
+            self.append({name: [row[name] for row in pending] for name in pending[0]})
+
+    def close(self):
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def column(self, name):
+        """_summary_
+        Return a read-only memory map of a column, the buffered rows are written first
+        """
+        self.flush()
+        if self.__rows == 0:
+            return np.empty(0, dtype=self.__dtypes[name])
+        return np.memmap(self.__path(name), dtype=self.__dtypes[name], mode="r", shape=(self.__rows,))
+
+    def radius_outliers(self, tolerance, expected=None):
+        """_summary_
+        Return the indexes of the rows where |detected - expected radius| > tolerance, or no circle was detected
+
+        Args:
+            tolerance (float): the accepted radius error in pixels.
+            expected (numpy.ndarray, optional): the expected radius of every row. Defaults to d / 2.
+        """
+        radius = self.column("radius")
+        expected = self.column("d") / 2 if expected is None else expected
+        with np.errstate(invalid="ignore"):
+            return np.flatnonzero(~(np.abs(radius - expected) <= tolerance))
+
+    def rows(self, indexes):
+        """_summary_
+        Return the rows at the indexes as dicts, with their method name and path, e.g. to report the outliers
+        """
+        columns = {name: self.column(name) for name, _ in COLUMNS}
+        offsets = np.fromfile(self.__path("path.offsets"), dtype="<i8", count=self.__rows)
+        rows = []
+        with open(self.__path("path.data"), "rb") as paths:
+            for i in indexes:
+                row = {name: column[i].item() for name, column in columns.items()}
+                row["method"] = None if row["method"] == NO_METHOD else METHODS[row["method"]]
+                row["seed"] = None if row["seed"] == -1 else row["seed"]
+                start = int(offsets[i - 1]) if i > 0 else 0
+                paths.seek(start)
+                row["path"] = paths.read(int(offsets[i]) - start).decode()
+                rows.append(row)
+        return rows